@@ -0,0 +1,217 @@
+# Planned, collision-safe renaming of the folders in a directory, with a journal to resume or roll back
+import json
+import os
+import sys
+
+
+# Journal of an unfinished batch, kept in the directory being renamed
+JOURNAL_NAME = '.batch_rename.journal'
+TEMP_PREFIX = '.batch_rename.tmp'
+
+
+class RenamePlan:
+    """ Every rename for one directory, checked and ordered before anything is touched.
+        renames maps each folder that will be renamed to its new name. conflicts lists
+        (name, new name, reason) for renames that were dropped: two folders wanting the
+        same name, a name that is not a plain folder name, or a name already taken by
+        something that is not itself being renamed away. Chains such as A->B, B->C are
+        ordered so nothing is overwritten, and cycles such as A->B, B->A go through a
+        temporary name. steps is the resulting list of (old, new) os.rename calls.
+    """
+
+    def __init__(self, directory, renames, existing):
+        self.directory = directory
+        self.conflicts = []
+        renames = {old: new for old, new in renames.items() if new != old}
+
+        # Targets wanted by more than one folder, or that are not a single plain name
+        wanted = {}
+        for old, new in renames.items():
+            wanted[new] = wanted.get(new, 0) + 1
+        for old, new in list(renames.items()):
+            if wanted[new] > 1:
+                self._drop(renames, old, 'another folder is being renamed to the same name')
+            elif not new or new in ('.', '..') or os.sep in new or (os.altsep and os.altsep in new):
+                self._drop(renames, old, 'the new name is not a valid folder name')
+
+        # A target is taken if something stays under that name. Dropping a rename leaves its
+        # folder where it was, which can block the rename before it in a chain, so follow those.
+        renamed_from = {new: old for old, new in renames.items()}
+        blocked = [old for old, new in renames.items() if new in existing and new not in renames]
+        while blocked:
+            old = blocked.pop()
+            self._drop(renames, old, 'the target folder already exists')
+            if old in renamed_from and renamed_from[old] in renames:
+                blocked.append(renamed_from[old])
+
+        self.renames = renames
+        self.steps = self._order(renames, existing)
+
+    def _drop(self, renames, old, reason):
+        self.conflicts.append((old, renames.pop(old), reason))
+
+    @staticmethod
+    def _order(renames, existing):
+        # Each name has at most one rename into it and one out of it, so the renames form
+        # separate chains and cycles. A chain is renamed from its free end backwards.
+        renamed_from = {new: old for old, new in renames.items()}
+        steps = []
+        done = set()
+        for old, new in renames.items():
+            if new in renames:
+                continue
+            while old is not None:
+                steps.append((old, renames[old]))
+                done.add(old)
+                old = renamed_from.get(old)
+
+        # What is left are cycles: park one folder under a temporary name to break each
+        taken = set(existing)
+        temp_count = 0
+        for start in renames:
+            if start in done:
+                continue
+            while f'{TEMP_PREFIX}{temp_count}' in taken:
+                temp_count += 1
+            temp = f'{TEMP_PREFIX}{temp_count}'
+            taken.add(temp)
+            steps.append((start, temp))
+            done.add(start)
+            current = start
+            while renamed_from[current] != start:
+                steps.append((renamed_from[current], current))
+                current = renamed_from[current]
+                done.add(current)
+            steps.append((temp, current))
+        return steps
+
+    def apply(self):
+        """ Carry out the renames, recording each step in a journal so that an interrupted
+            batch can be finished with resume() or undone with rollback().
+        """
+        if not self.steps:
+            return
+        journal_path = os.path.join(self.directory, JOURNAL_NAME)
+        if os.path.exists(journal_path):
+            raise FileExistsError(f"An unfinished rename batch is recorded in {journal_path}, resume or roll it back first")
+        with open(journal_path, 'x', encoding='utf-8') as journal:
+            json.dump({'directory': os.path.abspath(self.directory), 'steps': self.steps}, journal)
+            journal.write('\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        try:
+            _run_steps(self.directory, self.steps, set())
+        except OSError as e:
+            raise OSError(f"Renaming stopped part way ({e}), run 'python batch_rename.py resume' "
+                          f"or 'python batch_rename.py rollback' in {self.directory}") from e
+
+
+def plan_renames(directory, new_name):
+    """ List the folders in a directory once and plan renaming each one to new_name(name).
+        new_name returns the new name, or None (or the same name) to leave a folder alone.
+    """
+    existing = set()
+    renames = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            existing.add(entry.name)
+            if entry.is_dir():
+                target = new_name(entry.name)
+                if target is not None:
+                    renames[entry.name] = target
+    existing.add(JOURNAL_NAME)
+    return RenamePlan(directory, renames, existing)
+
+
+def _run_steps(directory, steps, done):
+    journal_path = os.path.join(directory, JOURNAL_NAME)
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        for number, (old, new) in enumerate(steps):
+            if number in done:
+                continue
+            os.rename(os.path.join(directory, old), os.path.join(directory, new))
+            journal.write(f'{number}\n')
+            journal.flush()
+    os.remove(journal_path)
+
+
+def _read_journal(directory):
+    # Return the journal's steps and the step numbers recorded as done, or None if there is no journal
+    journal_path = os.path.join(directory, JOURNAL_NAME)
+    try:
+        with open(journal_path, encoding='utf-8') as journal:
+            lines = journal.read().split('\n')
+    except FileNotFoundError:
+        return None
+    try:
+        steps = [tuple(step) for step in json.loads(lines[0])['steps']]
+        # A last line cut short by the interruption is ignored
+        done = {int(line) for line in lines[1:] if line.strip().isdigit()}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"{journal_path} is not a valid rename journal: {e}")
+
+    # Steps run in order, so only the one after the last recorded step can have happened
+    # without being recorded, if the run stopped right after renaming
+    number = len(done)
+    if number < len(steps):
+        old, new = steps[number]
+        if not os.path.lexists(os.path.join(directory, old)) and os.path.lexists(os.path.join(directory, new)):
+            done.add(number)
+    return steps, done
+
+
+def resume(directory):
+    """ Finish an interrupted batch. Returns the number of steps it still had to do, or None
+        if there was nothing to resume.
+    """
+    journal = _read_journal(directory)
+    if journal is None:
+        return None
+    steps, done = journal
+    _run_steps(directory, steps, done)
+    return len(steps) - len(done)
+
+
+def rollback(directory):
+    """ Undo the finished steps of an interrupted batch, newest first. Returns the number of
+        steps undone, or None if there was nothing to roll back.
+    """
+    journal = _read_journal(directory)
+    if journal is None:
+        return None
+    steps, done = journal
+    for number in sorted(done, reverse=True):
+        old, new = steps[number]
+        os.rename(os.path.join(directory, new), os.path.join(directory, old))
+    os.remove(os.path.join(directory, JOURNAL_NAME))
+    return len(done)
+
+
+def report(plan):
+    # Print what a plan did, in the wording the rename scripts use
+    for old, new, reason in plan.conflicts:
+        print(f'Cannot rename folder "{old}" to "{new}" because {reason}.')
+    for old, new in plan.renames.items():
+        print(f"Renamed: {old} -> {new}")
+
+
+def main():
+    # Usage: python batch_rename.py resume|rollback [directory]
+    if len(sys.argv) > 1 and sys.argv[1] in ('resume', 'rollback'):
+        directory = sys.argv[2] if len(sys.argv) > 2 else os.getcwd()
+        if sys.argv[1] == 'resume':
+            steps = resume(directory)
+            action = 'Finished'
+        else:
+            steps = rollback(directory)
+            action = 'Undid'
+        if steps is None:
+            print(f"No unfinished rename batch in {directory}")
+        else:
+            print(f"{action} {steps} rename steps in {directory}")
+        return
+    print("Usage: python batch_rename.py resume|rollback [directory]")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite
+Generates reproducible synthetic directory trees, text files and CSVs, times each tool
+against them and prints a JSON report for comparing runs across commits.
+"""
+
+import argparse
+import contextlib
+import csv
+import gzip
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from instrument import peak_rss_kb, read_proc_io
+
+
+# Input sizes for --scale; any of them can be overridden by its own option
+SCALES = {
+    'small': {'tree_depth': 3, 'tree_width': 3, 'files_per_dir': 20, 'text_mb': 20, 'csv_rows': 100000},
+    'medium': {'tree_depth': 4, 'tree_width': 4, 'files_per_dir': 40, 'text_mb': 200, 'csv_rows': 2000000},
+    'large': {'tree_depth': 5, 'tree_width': 5, 'files_per_dir': 50, 'text_mb': 2000, 'csv_rows': 30000000},
+}
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'theta', 'lambda', 'sigma', 'omega',
+         'north', 'south', 'east', 'west', 'report', 'invoice', 'draft', 'final', 'café', 'naïve']
+
+# Folders that dir_to_file prunes by default, so the tree exercises pruning too
+PRUNED_FOLDERS = ['.git', 'node_modules', '__pycache__']
+
+
+def generate_tree(root, depth, width, files_per_dir, binary_fraction=0.2, text_bytes=2048, seed=0):
+    """
+    Build a directory tree of text and binary files, with some AppleDouble (._) files.
+
+    Args:
+        root (str): Folder to create the tree in
+        depth (int): Levels of subfolders below root
+        width (int): Subfolders in each folder
+        files_per_dir (int): Files in each folder
+        binary_fraction (float): Share of files with binary content
+        text_bytes (int): Approximate size of each text file
+        seed (int): Random seed, so the same arguments give the same tree
+
+    Returns:
+        dict: Counts of files, dirs, bytes, AppleDouble and binary files created, the
+            files directly in root, and the files, bytes, AppleDouble and binary files
+            inside the PRUNED_FOLDERS
+    """
+    rng = random.Random(seed)
+    stats = {'files': 0, 'dirs': 0, 'bytes': 0, 'appledouble': 0, 'binary': 0, 'binary_bytes': 0,
+             'root_files': files_per_dir}
+
+    def fill(folder, level):
+        os.makedirs(folder, exist_ok=True)
+        stats['dirs'] += 1
+        for number in range(files_per_dir):
+            if rng.random() < binary_fraction:
+                name, data = f'image_{number}.bin', rng.randbytes(text_bytes)
+                stats['binary'] += 1
+                stats['binary_bytes'] += len(data)
+            else:
+                words = ' '.join(rng.choice(WORDS) for _ in range(text_bytes // 7))
+                name, data = f'notes_{number}.txt', words.encode('utf-8')
+            if number % 10 == 0:
+                name = '._' + name
+                stats['appledouble'] += 1
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(data)
+            stats['files'] += 1
+            stats['bytes'] += len(data)
+        if level < depth:
+            for number in range(width):
+                fill(os.path.join(folder, f'folder_{level}_{number}'), level + 1)
+
+    fill(root, 0)
+    before_pruned = dict(stats)
+    # Files sit one level down, so the pruned folders themselves hold nothing but a folder
+    for name in PRUNED_FOLDERS:
+        stats['dirs'] += 1
+        fill(os.path.join(root, name, 'pkg'), depth)
+    for key in ('files', 'bytes', 'appledouble', 'binary', 'binary_bytes'):
+        stats[f'pruned_{key}'] = stats[key] - before_pruned[key]
+    return stats
+
+
+def generate_text(path, size_bytes, seed=0):
+    """
+    Write a text file of random lines of words, about size_bytes long.
+
+    Returns:
+        int: Bytes written
+    """
+    rng = random.Random(seed)
+    lines = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))) + '\n' for _ in range(1000)]
+    block = ''.join(lines).encode('utf-8')
+    written = 0
+    with open(path, 'wb') as f:
+        while written < size_bytes:
+            f.write(block)
+            written += len(block)
+    return written
+
+
+def generate_csv(path, rows, seed=0, sku_cardinality=10000, filler_columns=10, quoted_fraction=0.01,
+                 stray_quote_fraction=0.01):
+    """
+    Write a CSV with columns of controlled cardinality.
+
+    Args:
+        path (str): Output file
+        rows (int): Data rows to write
+        seed (int): Random seed
+        sku_cardinality (int): Distinct values in the 'sku' column
+        filler_columns (int): Extra columns that extraction has to skip over
+        quoted_fraction (float): Share of rows with a quoted field containing a comma and newline
+        stray_quote_fraction (float): Share of rows with a quote inside an unquoted field, as
+            in 12" pipe, which csv.reader keeps as a literal quote
+
+    Returns:
+        dict: Rows, bytes, the exact distinct count of each column of interest and the
+            name of the column holding the quoted and stray-quote fields
+    """
+    rng = random.Random(seed)
+    header = ['id', 'status', 'sku', 'email'] + [f'c{i}' for i in range(filler_columns)]
+    statuses = ['active', 'inactive', 'pending']
+    filler = [f'value{i}' for i in range(100)]
+    email_cardinality = max(rows // 10, 1)
+    # Stepping by a large prime visits every value once per cycle, so distinct counts are exact
+    step = 104729
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row_number in range(rows):
+            row = [
+                str(row_number),
+                statuses[row_number % 3],
+                f'SKU-{row_number * step % sku_cardinality:06d}',
+                f'user{row_number * step % email_cardinality}@example.com',
+            ]
+            row.extend(rng.choice(filler) for _ in range(filler_columns))
+            chance = rng.random()
+            if chance < quoted_fraction:
+                row[-1] = f'note {row_number % 100}, with a comma\nand a newline'
+            elif chance < quoted_fraction + stray_quote_fraction:
+                # csv.writer would quote this field, so write the line as a hand-made export would
+                row[-1] = f'{row_number % 100}" pipe'
+                f.write(','.join(row) + '\r\n')
+                continue
+            writer.writerow(row)
+
+    return {
+        'rows': rows,
+        'bytes': os.path.getsize(path),
+        'cardinality': {'status': min(len(statuses), rows), 'sku': min(sku_cardinality, rows),
+                        'email': min(email_cardinality, rows)},
+        'quoted_column': header[-1],
+    }
+
+
+def _check(name, found, expected):
+    if found != expected:
+        raise AssertionError(f"Found {found} {name}, expected {expected}")
+
+
+def bench_count_files(inputs):
+    from count_files import count_subfolder_files
+    stats = inputs['tree_stats']
+    rows = count_subfolder_files(inputs['tree'])
+    # Each top-level row counts everything below it, so with root's own files they cover the tree
+    top_level_total = sum(file_count for _, depth, file_count in rows if depth == 1)
+    _check('files in top-level folder totals', top_level_total + stats['root_files'], stats['files'])
+    return stats['files'], 0
+
+
+def bench_dir_to_csv(inputs):
+    from dir_to_csv import list_files_in_directory
+    output_file = os.path.join(inputs['tree'], 'file_list.csv')
+    list_files_in_directory(inputs['tree'])
+
+    def check():
+        try:
+            with open(output_file, newline='') as f:
+                # The CSV is created before the walk, so it may list itself
+                rows = [row for row in list(csv.reader(f))[1:] if row[:2] != ['', 'file_list.csv']]
+        finally:
+            os.remove(output_file)
+        _check('CSV rows', len(rows), inputs['tree_stats']['files'])
+    return inputs['tree_stats']['files'], 0, check
+
+
+def bench_dir_to_file(inputs):
+    from dir_to_file import scrape_directory
+    stats = inputs['tree_stats']
+    output_file = os.path.join(inputs['work_dir'], 'scrape_output.txt')
+    scrape_directory(inputs['tree'], output_file, prune=True, workers=4)
+
+    # Pruned folders are never read and binary files are rejected, so only the rest counts
+    binary = stats['binary'] - stats['pruned_binary']
+    text_files = stats['files'] - stats['pruned_files'] - binary
+    text_bytes = stats['bytes'] - stats['pruned_bytes'] - (stats['binary_bytes'] - stats['pruned_binary_bytes'])
+
+    def check():
+        # Reads back the whole output, so it runs after the timing stops
+        try:
+            with open(output_file, encoding='utf-8') as f:
+                summary = dict(line.rstrip('\n').split(': ', 1) for line in f if line.startswith(('Files ', 'Errors ', 'Directories ')))
+        finally:
+            os.remove(output_file)
+        _check('files processed in the summary', int(summary['Files Processed']), text_files)
+        _check('errors in the summary', int(summary['Errors Encountered']), binary)
+        _check('pruned directories in the summary', int(summary['Directories Pruned']), len(PRUNED_FOLDERS))
+    return text_files, text_bytes, check
+
+
+def bench_directory_cleaner(inputs):
+    from directory_cleaner import find_matching_files
+    matches = find_matching_files(inputs['tree'], r'^\._')
+    if len(matches) != inputs['tree_stats']['appledouble']:
+        raise AssertionError(f"Found {len(matches)} AppleDouble files, expected {inputs['tree_stats']['appledouble']}")
+    return inputs['tree_stats']['files'], 0
+
+
+def bench_directory_cleaner_rules(inputs):
+    from directory_cleaner import find_matching_files
+    from tree_index import open_index
+    stats = inputs['tree_stats']
+    patterns = [r'^\._', r'.*\.tmp$']
+    exclude_dirs = [f'{re.escape(name)}$' for name in PRUNED_FOLDERS]
+    include_dirs = ['folder_', 'pkg$'] + exclude_dirs
+    index_path = os.path.join(inputs['work_dir'], 'tree_index.sqlite')
+    try:
+        # The index must apply folder rules exactly as the pruned walk does
+        with open_index(inputs['tree'], index_path) as index:
+            for rules in ({'exclude_dirs': exclude_dirs}, {'include_dirs': include_dirs, 'exclude_dirs': exclude_dirs[:1]}):
+                walked = find_matching_files(inputs['tree'], patterns, **rules)
+                indexed = find_matching_files(inputs['tree'], patterns, index, **rules)
+                if sorted(walked) != sorted(indexed):
+                    raise AssertionError(f"Walk found {len(walked)} files and the index {len(indexed)} with {rules}")
+            expected = stats['appledouble'] - stats['pruned_appledouble']
+            matches = find_matching_files(inputs['tree'], patterns, index, exclude_dirs=exclude_dirs)
+            if len(matches) != expected:
+                raise AssertionError(f"Found {len(matches)} AppleDouble files outside pruned folders, expected {expected}")
+    finally:
+        os.remove(index_path)
+    return stats['files'], 0
+
+
+def bench_split_txt(inputs):
+    from split_txt import manifest_path_for, split_file, verify_parts
+    part_dir = os.path.join(inputs['work_dir'], 'split')
+    os.makedirs(part_dir, exist_ok=True)
+    source = os.path.join(part_dir, 'text.txt')
+    os.link(inputs['text'], source)
+    try:
+        split_file(source, max_size_mb=max(inputs['text_bytes'] / 1024 / 1024 / 8, 1), workers=4)
+    except BaseException:
+        shutil.rmtree(part_dir)
+        raise
+
+    def check():
+        # Re-reads every part, so it runs after the timing stops
+        try:
+            problems = verify_parts(manifest_path_for(source))
+            if problems:
+                raise AssertionError(f"Split parts do not match the source: {problems}")
+        finally:
+            shutil.rmtree(part_dir)
+    return 1, inputs['text_bytes'], check
+
+
+def bench_csvrow_to_set(inputs):
+    import csvrow_to_set
+    csvrow_to_set.cwd = inputs['work_dir']
+    values = csvrow_to_set.extract_column_data('data.csv', 'sku')
+    if len(values) != inputs['csv_stats']['cardinality']['sku']:
+        raise AssertionError(f"Found {len(values)} SKUs, expected {inputs['csv_stats']['cardinality']['sku']}")
+    return inputs['csv_stats']['rows'], inputs['csv_stats']['bytes']
+
+
+def _bench_multi_column(inputs, workers):
+    import multi_column_extractor
+    multi_column_extractor.cwd = inputs['work_dir']
+    data = multi_column_extractor.extract_columns_data('data.csv', ['status', 'sku', 'email'], workers)
+    for header, values in data.items():
+        if len(values) != inputs['csv_stats']['cardinality'][header]:
+            raise AssertionError(f"Found {len(values)} values of {header}, expected {inputs['csv_stats']['cardinality'][header]}")
+    return inputs['csv_stats']['rows'], inputs['csv_stats']['bytes']
+
+
+def bench_multi_column_extractor(inputs):
+    return _bench_multi_column(inputs, 1)
+
+
+def bench_multi_column_extractor_parallel(inputs):
+    workers = os.cpu_count() or 1
+
+    def check():
+        # Row ranges must be cut exactly where the single-process reader ends rows, quoted
+        # newlines and stray quotes included, so the parallel result has to match it exactly
+        from csv_columns import column_indices, read_file_fieldnames, unique_values_in_file, unique_values_parallel
+        path = os.path.join(inputs['work_dir'], 'data.csv')
+        column = inputs['csv_stats']['quoted_column']
+        single = unique_values_in_file(path, [column])
+        indices = column_indices(read_file_fieldnames(path), [column])
+        parallel = unique_values_parallel(path, indices, max(workers, 4))
+        if parallel != single:
+            raise AssertionError(f"Parallel extraction of {column} found {len(parallel[0])} values, "
+                                 f"a single process {len(single[0])}")
+
+        # A compressed copy cannot be split by byte offset, so it must still be read as text
+        import multi_column_extractor
+        gz_path = path + '.gz'
+        with open(path, 'rb') as f, gzip.open(gz_path, 'wb') as gz:
+            shutil.copyfileobj(f, gz)
+        try:
+            compressed = multi_column_extractor.extract_columns_data('data.csv.gz', [column], max(workers, 4))
+        finally:
+            os.remove(gz_path)
+        if compressed is None or compressed[column] != single[0]:
+            raise AssertionError(f"Extraction from a gzip copy did not match the plain file for {column}")
+    return (*_bench_multi_column(inputs, workers), check)
+
+
+BENCHMARKS = {
+    'count_files': bench_count_files,
+    'dir_to_csv': bench_dir_to_csv,
+    'dir_to_file': bench_dir_to_file,
+    'directory_cleaner': bench_directory_cleaner,
+    'directory_cleaner_rules': bench_directory_cleaner_rules,
+    'split_txt': bench_split_txt,
+    'csvrow_to_set': bench_csvrow_to_set,
+    'multi_column_extractor': bench_multi_column_extractor,
+    'multi_column_extractor_parallel': bench_multi_column_extractor_parallel,
+}
+
+# What read_calls and write_calls measure, stated in every report. They come from syscr and
+# syscw in /proc/self/io, so they exist only on Linux and are not a full syscall count.
+READ_CALLS_NOTE = ("read-type syscalls (read, pread, readv, ...) made by the benchmark process itself, from "
+                   "syscr in /proc/self/io on Linux; open, stat, getdents and all other syscalls, and calls "
+                   "made by worker processes, are not counted")
+WRITE_CALLS_NOTE = ("write-type syscalls (write, pwrite, writev, ...) made by the benchmark process itself, "
+                    "from syscw in /proc/self/io on Linux; other syscalls and worker processes are not counted")
+
+
+def _run_in_child(name, inputs, results):
+    # Each benchmark gets a fresh process, so peak memory and read/write call counts are its own
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        io_before = read_proc_io()
+        start = time.perf_counter()
+        # A benchmark may also return a check that is too slow to include in the timing
+        items, processed_bytes, *check = BENCHMARKS[name](inputs)
+        seconds = time.perf_counter() - start
+        io_after = read_proc_io()
+        for slow_check in check:
+            slow_check()
+
+    result = {
+        'seconds': round(seconds, 4),
+        'items': items,
+        'items_per_sec': round(items / seconds, 1) if seconds else None,
+        'bytes': processed_bytes,
+        'mb_per_sec': round(processed_bytes / 1024 / 1024 / seconds, 2) if seconds and processed_bytes else None,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+    if io_before:
+        result['read_calls'] = io_after['syscr'] - io_before['syscr']
+        result['write_calls'] = io_after['syscw'] - io_before['syscw']
+    results.put(result)
+
+
+def run_benchmark(name, inputs, repeat=1):
+    """
+    Run one benchmark repeat times, each in a new process, and keep the fastest run.
+
+    Returns:
+        dict: Timing, throughput, peak RSS and read/write call counts, or an 'error'
+    """
+    context = multiprocessing.get_context('spawn')
+    best = None
+    for _ in range(repeat):
+        results = context.Queue()
+        process = context.Process(target=_run_in_child, args=(name, inputs, results))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            return {'error': f"exited with code {process.exitcode}"}
+        result = results.get()
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark every tool against reproducible synthetic inputs",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Quick run, report to the terminal
+  python benchmark.py
+
+  # Bigger inputs, three runs per benchmark, saved for comparison
+  python benchmark.py --scale medium --repeat 3 --output bench_abc123.json
+
+  # Only the CSV tools against a 5 million row file
+  python benchmark.py --only csvrow_to_set,multi_column_extractor --csv-rows 5000000
+        """
+    )
+    parser.add_argument("--scale", choices=SCALES, default='small', help="Preset input sizes")
+    parser.add_argument("--tree-depth", type=int, help="Levels of subfolders in the tree")
+    parser.add_argument("--tree-width", type=int, help="Subfolders in each folder")
+    parser.add_argument("--files-per-dir", type=int, help="Files in each folder")
+    parser.add_argument("--text-mb", type=float, help="Size of the text file for split_txt")
+    parser.add_argument("--csv-rows", type=int, help="Data rows in the CSV")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated inputs")
+    parser.add_argument("--only", help="Comma-separated benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per benchmark, keeping the fastest")
+    parser.add_argument("--work-dir", help="Folder for generated inputs (default: a temporary folder)")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated inputs afterwards")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Error: Unknown benchmark(s) {unknown}. Choose from {list(BENCHMARKS)}")
+        return 1
+
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix='benchmark_'))
+    os.makedirs(work_dir, exist_ok=True)
+    # Tools are imported from this folder in each benchmark process
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        print(f"Generating inputs in {work_dir}", file=sys.stderr)
+        inputs = {'work_dir': work_dir, 'tree': os.path.join(work_dir, 'tree'), 'text': os.path.join(work_dir, 'text.txt')}
+        inputs['tree_stats'] = generate_tree(inputs['tree'], sizes['tree_depth'], sizes['tree_width'],
+                                             sizes['files_per_dir'], seed=args.seed)
+        inputs['text_bytes'] = generate_text(inputs['text'], int(sizes['text_mb'] * 1024 * 1024), seed=args.seed)
+        inputs['csv_stats'] = generate_csv(os.path.join(work_dir, 'data.csv'), sizes['csv_rows'], seed=args.seed)
+
+        results = {}
+        for name in names:
+            print(f"Running {name}", file=sys.stderr)
+            results[name] = run_benchmark(name, inputs, args.repeat)
+
+        report = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'sizes': sizes,
+            'inputs': {key: inputs[key] for key in ('tree_stats', 'text_bytes', 'csv_stats')},
+            'results': results,
+            'notes': {'read_calls': READ_CALLS_NOTE, 'write_calls': WRITE_CALLS_NOTE},
+        }
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,178 @@
+# Persistent dictionary-encoded cache of CSV columns, so repeated extractions skip parsing
+import csv
+import hashlib
+import json
+import os
+import shutil
+import sys
+from array import array
+from csv_columns import read_fieldnames, split_rows
+
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'csv_column_cache')
+
+# Codes below FIRST_VALUE_CODE mark a field that is missing (short row) or empty
+MISSING_CODE = 0
+EMPTY_CODE = 1
+FIRST_VALUE_CODE = 2
+
+
+class ColumnCache:
+    """ On-disk cache of dictionary-encoded columns for one CSV file.
+        Each cached column is stored as its distinct stripped values (the dictionary)
+        and one integer code per row pointing into it, so unique values, counts and
+        filters can all be answered without parsing the CSV again. The cache is keyed
+        on the file's absolute path and is thrown away once its size or mtime changes.
+        Columns are encoded the first time they are asked for, in one pass over the file
+        for all of the missing ones.
+    """
+
+    def __init__(self, file_path, cache_dir=None):
+        self.file_path = os.path.abspath(file_path)
+        key = hashlib.sha1(self.file_path.encode('utf-8', 'surrogatepass')).hexdigest()
+        self.folder = os.path.join(cache_dir or CACHE_DIR, key)
+        self.meta_path = os.path.join(self.folder, 'meta.json')
+
+        stat = os.stat(self.file_path)
+        self.meta = {'path': self.file_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                     'rows': None, 'columns': []}
+        try:
+            with open(self.meta_path, encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            meta = None
+
+        if meta and all(meta.get(key) == self.meta[key] for key in ('path', 'size', 'mtime_ns')):
+            self.meta = meta
+        elif os.path.isdir(self.folder):
+            # The file changed since it was cached, start again
+            shutil.rmtree(self.folder, ignore_errors=True)
+        self._columns = {}
+
+    def cached_indices(self):
+        return set(self.meta['columns'])
+
+    def _paths(self, index):
+        return (os.path.join(self.folder, f'col{index}.json'),
+                os.path.join(self.folder, f'col{index}.codes'))
+
+    def encode(self, indices):
+        """ Parse the file once to encode whichever of these column indices are not cached.
+            Returns the indices that had to be encoded.
+        """
+        missing = sorted(set(indices) - self.cached_indices())
+        if not missing:
+            return []
+
+        lookups = [{} for _ in missing]
+        dictionaries = [[None, ''] for _ in missing]
+        codes = [array('I') for _ in missing]
+        rows = 0
+
+        with open(self.file_path) as csvfile:
+            read_fieldnames(csv.reader(csvfile))
+            for row in split_rows(csvfile, ',', missing[-1]):
+                rows += 1
+                length = len(row)
+                for index, lookup, dictionary, column_codes in zip(missing, lookups, dictionaries, codes):
+                    if index >= length:
+                        column_codes.append(MISSING_CODE)
+                        continue
+                    value = row[index]
+                    if not value:
+                        column_codes.append(EMPTY_CODE)
+                        continue
+                    value = value.strip()
+                    code = lookup.get(value)
+                    if code is None:
+                        code = lookup[value] = len(dictionary)
+                        dictionary.append(value)
+                    column_codes.append(code)
+
+        os.makedirs(self.folder, exist_ok=True)
+        for index, dictionary, column_codes in zip(missing, dictionaries, codes):
+            values_path, codes_path = self._paths(index)
+            with open(values_path, 'w', encoding='utf-8') as values_file:
+                json.dump(dictionary[FIRST_VALUE_CODE:], values_file)
+            with open(codes_path, 'wb') as codes_file:
+                column_codes.tofile(codes_file)
+            self._columns[index] = (dictionary, column_codes)
+
+        # Write the metadata last, so a cache interrupted mid-write is never trusted
+        self.meta['rows'] = rows
+        self.meta['columns'] = sorted(self.cached_indices() | set(missing))
+        temp_path = self.meta_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as meta_file:
+            json.dump(self.meta, meta_file)
+        os.replace(temp_path, self.meta_path)
+        return missing
+
+    def column(self, index):
+        """ Return (dictionary, codes) for a cached column. dictionary[code] is the stripped
+            value of a row's field for codes from FIRST_VALUE_CODE up.
+        """
+        if index not in self._columns:
+            values_path, codes_path = self._paths(index)
+            with open(values_path, encoding='utf-8') as values_file:
+                dictionary = [None, ''] + json.load(values_file)
+            codes = array('I')
+            with open(codes_path, 'rb') as codes_file:
+                codes.fromfile(codes_file, self.meta['rows'])
+            self._columns[index] = (dictionary, codes)
+        return self._columns[index]
+
+    def _row_mask(self, where):
+        # True for each row passing every (index, allowed values) condition, as filter_rows does
+        mask = None
+        for index, allowed in where:
+            dictionary, codes = self.column(index)
+            passing = [code >= EMPTY_CODE and dictionary[code] in allowed for code in range(len(dictionary))]
+            column_mask = [passing[code] for code in codes]
+            mask = column_mask if mask is None else [a and b for a, b in zip(mask, column_mask)]
+        return mask
+
+    def unique_values(self, indices, collector=set, where=None, counting=False):
+        """ Answer csv_columns.unique_values for these indices from the cache, encoding
+            any that are missing first. Without filters or counting, each collector only
+            sees the distinct values; otherwise every row's value is added, as in a scan.
+        """
+        self.encode(list(indices) + [index for index, _ in where or ()])
+        mask = self._row_mask(where) if where else None
+
+        sets = []
+        for index in indices:
+            dictionary, codes = self.column(index)
+            values = collector()
+            add = values.add
+            if mask is None and not counting:
+                for value in dictionary[FIRST_VALUE_CODE:]:
+                    add(value)
+            else:
+                rows = codes if mask is None else (code for code, keep in zip(codes, mask) if keep)
+                for code in rows:
+                    if code >= FIRST_VALUE_CODE:
+                        add(dictionary[code])
+            sets.append(values)
+        return sets
+
+    def clear(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+        self.meta['columns'] = []
+        self._columns = {}
+
+
+def main():
+    # Usage: python column_cache.py clear [file.csv]
+    if len(sys.argv) > 1 and sys.argv[1] == 'clear':
+        if len(sys.argv) > 2:
+            ColumnCache(sys.argv[2]).clear()
+            print(f"Cleared the column cache for {sys.argv[2]}")
+        else:
+            shutil.rmtree(CACHE_DIR, ignore_errors=True)
+            print(f"Cleared {CACHE_DIR}")
+        return
+    print("Usage: python column_cache.py clear [file.csv]")
+
+
+if __name__ == '__main__':
+    main()
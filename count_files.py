@@ -3,9 +3,60 @@
 
 import os
 import csv
+import sys
+import instrument
+from scan_tree import scan_tree
+from tree_index import open_index
 
-def list_subfolders_with_file_counts(directory: str) -> None:
+def count_subfolder_files(directory: str, max_depth: int = None, index=None) -> list:
+    """ Walk the directory tree once and return (subfolder, depth, file count) rows.
+        Rows are in the same order os.walk visits the subfolders. Each count covers every
+        file below the subfolder; max_depth only limits which rows are returned.
+        Pass a refreshed TreeIndex to answer from the index instead of the filesystem.
+    """
+    rows = []
+    totals = {'': 0}
+
+    if index is not None:
+        # The index already knows how many files sit directly in each folder
+        totals.update(index.file_counts())
+        records = index.iter_records(include_files=False, include_dirs=True)
+    else:
+        records = scan_tree(directory, include_dirs=True, with_stat=False)
+
+    # Single pass: count files directly in each folder and record every subfolder seen
+    for record in instrument.timed_iter(records, 'walk', 'entries'):
+        if record.is_dir:
+            subfolder = os.path.join(record.folder, record.name)
+            depth = record.folder.count(os.sep) + 2 if record.folder else 1
+            rows.append((subfolder, record, depth))
+            if not record.is_link:
+                totals.setdefault(subfolder, 0)
+        else:
+            totals[record.folder] += 1
+
+    # Rows come out parent-first, so reversing adds every child's total before its parent's
+    for subfolder, record, depth in reversed(rows):
+        if not record.is_link:
+            totals[record.folder] += totals[subfolder]
+    instrument.count('files', totals[''])
+
+    result = []
+    for subfolder, record, depth in rows:
+        if max_depth is not None and depth > max_depth:
+            continue
+        if record.is_link:
+            # Symlinked folders are not followed by the walk, count them separately
+            file_count = sum(1 for _ in scan_tree(record.path, with_stat=False))
+        else:
+            file_count = totals[subfolder]
+        result.append((record.name, depth, file_count))
+    return result
+
+def list_subfolders_with_file_counts(directory: str, max_depth: int = None, use_index: bool = False) -> None:
     """ This function takes a directory path and writes a CSV file with subfolders and their file counts.
+        Pass max_depth to only write rows for the top N levels of subfolders.
+        With use_index, counts come from the directory's SQLite tree index after a refresh.
     """
     try:
         # Normalize the directory path and check if it's absolute
@@ -29,22 +80,44 @@ def list_subfolders_with_file_counts(directory: str) -> None:
             writer = csv.writer(file)
             writer.writerow(['SKU', 'Subfolder', 'File Count'])  # Header row
             
-            # Walk through the directory
-            for root, dirs, files in os.walk(directory):
-                for subfolder in dirs:
-                    subfolder_path = os.path.join(root, subfolder)
-                    subfolder = subfolder
+            # Count every subfolder in a single pass over the tree
+            index = open_index(directory) if use_index else None
+            try:
+                for subfolder, depth, file_count in count_subfolder_files(directory, max_depth, index):
                     sku = subfolder.split("_")[0]
-                    file_count = sum(len(files) for _, _, files in os.walk(subfolder_path))
                     writer.writerow([sku, subfolder, file_count])
+            finally:
+                if index is not None:
+                    index.close()
                     
         print(f"CSV file has been created: {output_file}")
     except Exception as e:
         print(f"Error: {e}")
 
 def main():
+    instrument.profile_from_argv('count_files')
     directory = os.getcwd()
-    list_subfolders_with_file_counts(directory)
+    # Optional depth limit, e.g. "countfiles 2" for the top two levels only,
+    # and "--index" to answer from the tree index
+    usage = "Usage: python count_files.py [max_depth] [--index]"
+    args = [arg for arg in sys.argv[1:] if arg != '--index']
+    unknown = [arg for arg in args if arg.startswith('-') and not arg[1:].isdigit()]
+    if unknown:
+        print(f"Error: Unknown option(s) {unknown}")
+        print(usage)
+        return
+    if len(args) > 1:
+        print(f"Error: Expected at most one depth, got {args}")
+        print(usage)
+        return
+    max_depth = None
+    if args:
+        if not args[0].isdigit() or int(args[0]) == 0:
+            print(f"Error: max_depth must be a positive whole number, got '{args[0]}'")
+            print(usage)
+            return
+        max_depth = int(args[0])
+    list_subfolders_with_file_counts(directory, max_depth, '--index' in sys.argv[1:])
 
 if __name__ == "__main__":
     main()
@@ -1,28 +1,41 @@
 # Extract all unique entries from a specific csv column by header name
 import csv
 import os
+import sys
+import instrument
+from functools import partial
 from helpers import GetArgument
+from sketches import HyperLogLog, ValueCounter
+from csv_columns import column_indices, read_fieldnames, split_rows, unique_values
 
 
 cwd = os.getcwd()
 
-def extract_column_data(filename, column_header):
-    unique_data = set()
+def extract_column_data(filename, column_header, approximate=False, error_rate=0.01, count=False):
+    # With approximate=True, returns a HyperLogLog sketch whose len() estimates the unique count
+    # With count=True, returns a ValueCounter of how often each value occurs
+    if count:
+        collector = ValueCounter
+    else:
+        collector = partial(HyperLogLog, error_rate) if approximate else set
     file_path = cwd + "/" + filename
     
     with open(file_path) as csvfile:
-        raw_data = csv.DictReader(csvfile, delimiter=',')
+        raw_data = csv.reader(csvfile, delimiter=',')
+        fieldnames = read_fieldnames(raw_data)
         
         # Check if the column header exists
-        if column_header not in raw_data.fieldnames:
+        if column_header not in fieldnames:
             print(f"Error: Column '{column_header}' not found in CSV file.")
-            print(f"Available columns: {raw_data.fieldnames}")
+            print(f"Available columns: {fieldnames}")
             return None
         
-        for row in raw_data:
-            value = row[column_header]
-            if value:  # Only add non-empty values
-                unique_data.add(value.strip())  # Strip whitespace
+        # Look the column up once, then only split each row as far as that field
+        indices = column_indices(fieldnames, [column_header])
+        rows = instrument.timed_iter(split_rows(csvfile, ',', max(indices)), 'read', 'rows')
+        with instrument.phase('parse'):
+            unique_data, = unique_values(rows, indices, collector)
+        instrument.count('bytes', os.path.getsize(file_path))
 
     return unique_data
 
@@ -39,16 +52,56 @@ def set_to_csv(python_set, output_filename):
         for item in python_set:
             output.writerow([item])
 
+
+def counts_to_csv(counts, output_filename, top_k=None):
+    # Most frequent values first, optionally only the top_k of them
+    file_path = cwd + "/" + output_filename
+    with open(file_path, 'w', newline='') as csvfile:
+        output = csv.writer(csvfile)
+        output.writerow(['value', 'count'])
+        output.writerows(counts.top(top_k))
+
 def main():
+    instrument.profile_from_argv('csvrow_to_set')
     filename = GetArgument("Enter filename in current directory\n", 1)
     column_header = GetArgument("Enter column header name\n", 2)
     
+    # "--count" as a third argument only estimates the number of unique values
+    if '--count' in sys.argv[3:]:
+        sketch = extract_column_data(filename, column_header, approximate=True)
+        if sketch is not None:
+            print(f"Column '{column_header}' has ~{len(sketch)} unique values (about 1% error)")
+        return
+    
+    # "--frequencies" counts every value, "--top N" keeps only the N most frequent
+    options = sys.argv[3:]
+    if '--frequencies' in options or '--top' in options:
+        top_k = None
+        if '--top' in options:
+            position = options.index('--top') + 1
+            top_input = options[position] if position < len(options) else ''
+            if not top_input.isdigit() or int(top_input) == 0:
+                print(f"Error: --top needs a positive whole number, got '{top_input}'")
+                print("Usage: python csvrow_to_set.py <filename> <column> [--count | --frequencies | --top N]")
+                return
+            top_k = int(top_input)
+        counts = extract_column_data(filename, column_header, count=True)
+        if counts:
+            output_filename = f"{column_header}_counts.csv"
+            counts_to_csv(counts, output_filename, top_k)
+            print(f"Counted {sum(counts.values())} values, {len(counts)} unique, in column '{column_header}'")
+            print(f"Output saved to {output_filename}")
+        else:
+            print("No data extracted.")
+        return
+    
     unique_data = extract_column_data(filename, column_header)
 
     output_filename = f"{column_header}.csv"
     
     if unique_data:
-        set_to_csv(unique_data, output_filename)
+        with instrument.phase('write'):
+            set_to_csv(unique_data, output_filename)
         print(f"Extracted {len(unique_data)} unique values from column '{column_header}'")
         print(f"Output saved to {output_filename}")
     else:
@@ -1,4 +1,10 @@
 import csv
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+from hashlib import blake2b
 
 def dictToCSV(filename: str, data: list, header: list) -> None:
     with open(filename, 'w') as csvfile:
@@ -20,3 +26,174 @@ def listToCSV(filename: str, data: list) -> None:
     with open(filename, 'w') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerows(data)
+
+
+# On-disk hash index: header, then key/value records, then an open-addressing slot table.
+# Each slot holds a key's 64-bit hash and its record offset + 1, with 0 marking an empty slot.
+INDEX_MAGIC = b'CSVIDX1\0'
+INDEX_HEADER = struct.Struct('<8sQQQqQ')  # magic, count, slot count, slots offset, source mtime_ns, source size
+INDEX_SLOT = struct.Struct('<QQ')
+INDEX_RECORD = struct.Struct('<II')  # key length, value length
+
+
+def _keyHash(key: bytes) -> int:
+    # Stable across runs, unlike hash(), since the table is stored on disk
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), 'little')
+
+
+def _encode(text: str) -> bytes:
+    return text.encode('utf-8', 'surrogatepass')
+
+
+def _firstTwoColumns(row: list) -> tuple:
+    return row[0], row[1]
+
+
+class MappedDict(Mapping):
+    """Read-only dict over an index file from csvToIndex, memory-mapped rather than loaded.
+    Opening only reads the header, and each lookup hashes the key and probes a few slots,
+    so startup and memory stay flat however many mappings there are. Iteration follows
+    the CSV, with a repeated key appearing where its last (winning) row is."""
+
+    def __init__(self, index_file: str):
+        self.index_file = index_file
+        with open(index_file, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, self._slots, self._slots_offset, self.source_mtime_ns, self.source_size = \
+            INDEX_HEADER.unpack_from(self._data)
+        if magic != INDEX_MAGIC:
+            self._data.close()
+            raise ValueError(f"{index_file} is not a CSV index file")
+        self._mask = self._slots - 1
+
+    def _record(self, offset: int) -> tuple:
+        key_length, value_length = INDEX_RECORD.unpack_from(self._data, offset)
+        start = offset + INDEX_RECORD.size
+        return self._data[start:start + key_length], start + key_length, value_length
+
+    def _find(self, key: bytes) -> int:
+        # Return the record offset for a key, or -1 if it is not in the index
+        key_hash = _keyHash(key)
+        slot = key_hash & self._mask
+        while True:
+            stored_hash, stored_offset = INDEX_SLOT.unpack_from(self._data, self._slots_offset + slot * INDEX_SLOT.size)
+            if stored_offset == 0:
+                return -1
+            if stored_hash == key_hash and self._record(stored_offset - 1)[0] == key:
+                return stored_offset - 1
+            slot = (slot + 1) & self._mask
+
+    def __getitem__(self, key: str) -> str:
+        if not isinstance(key, str):
+            raise KeyError(key)
+        offset = self._find(_encode(key))
+        if offset < 0:
+            raise KeyError(key)
+        _, value_start, value_length = self._record(offset)
+        return self._data[value_start:value_start + value_length].decode('utf-8', 'surrogatepass')
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self._find(_encode(key)) >= 0
+
+    def __iter__(self):
+        offset = INDEX_HEADER.size
+        while offset < self._slots_offset:
+            key, value_start, value_length = self._record(offset)
+            # Skip rows overridden by a later row with the same key
+            if self._find(key) == offset:
+                yield key.decode('utf-8', 'surrogatepass')
+            offset = value_start + value_length
+
+    def __len__(self) -> int:
+        return self._count
+
+    def isCurrent(self, csv_file: str) -> bool:
+        # True if the index was built from the CSV as it is now
+        stat = os.stat(csv_file)
+        return (stat.st_mtime_ns, stat.st_size) == (self.source_mtime_ns, self.source_size)
+
+    def close(self) -> None:
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def buildIndex(csv_file: str, index_file: str, row_to_item=_firstTwoColumns) -> None:
+    """Write a hash index of a CSV file's rows, keyed like csvToDict by default.
+    row_to_item turns each csv.reader row into a (key, value) pair; for a repeated key the
+    last row wins, as in a dict. Records are streamed to disk as they are read, so only
+    a hash and an offset per row are held in memory."""
+    hashes = array('Q')
+    offsets = array('Q')
+    temp_file = index_file + '.tmp'
+    stat = os.stat(csv_file)
+
+    with open(csv_file, 'r', newline='') as file, open(temp_file, 'w+b') as out:
+        out.write(bytes(INDEX_HEADER.size))
+        offset = INDEX_HEADER.size
+        for row in csv.reader(file):
+            key, value = row_to_item(row)
+            key, value = _encode(key), _encode(value)
+            out.write(INDEX_RECORD.pack(len(key), len(value)))
+            out.write(key)
+            out.write(value)
+            hashes.append(_keyHash(key))
+            offsets.append(offset)
+            offset += INDEX_RECORD.size + len(key) + len(value)
+        slots_offset = offset
+
+        # Power-of-two table at most half full keeps probe sequences short
+        slots = 16
+        while slots < 2 * len(hashes):
+            slots *= 2
+        table = bytearray(slots * INDEX_SLOT.size)
+        mask = slots - 1
+        count = 0
+
+        out.flush()
+        with mmap.mmap(out.fileno(), 0, access=mmap.ACCESS_READ) as records:
+            def recordKey(record_offset):
+                key_length, _ = INDEX_RECORD.unpack_from(records, record_offset)
+                start = record_offset + INDEX_RECORD.size
+                return records[start:start + key_length]
+
+            for key_hash, record_offset in zip(hashes, offsets):
+                slot = key_hash & mask
+                while True:
+                    stored_hash, stored_offset = INDEX_SLOT.unpack_from(table, slot * INDEX_SLOT.size)
+                    if stored_offset == 0:
+                        count += 1
+                        break
+                    if stored_hash == key_hash and recordKey(stored_offset - 1) == recordKey(record_offset):
+                        break  # Repeated key, the later row replaces it
+                    slot = (slot + 1) & mask
+                INDEX_SLOT.pack_into(table, slot * INDEX_SLOT.size, key_hash, record_offset + 1)
+
+        out.seek(slots_offset)
+        out.write(table)
+        out.seek(0)
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, count, slots, slots_offset, stat.st_mtime_ns, stat.st_size))
+
+    os.replace(temp_file, index_file)
+
+
+def csvToIndex(csv_file: str, index_file: str = None, row_to_item=_firstTwoColumns) -> MappedDict:
+    """Like csvToDict, but returns a MappedDict backed by an index file next to the CSV.
+    The index is built on first use and rebuilt only when the CSV's size or mtime changes,
+    so later runs open it almost instantly. Pass a different index_file for each row_to_item."""
+    index_file = index_file or csv_file + '.idx'
+    if os.path.exists(index_file):
+        try:
+            index = MappedDict(index_file)
+        except (OSError, ValueError, struct.error):
+            index = None
+        if index is not None:
+            if index.isCurrent(csv_file):
+                return index
+            index.close()
+    buildIndex(csv_file, index_file, row_to_item)
+    return MappedDict(index_file)
@@ -1,10 +1,16 @@
 import os
 import csv
-import sys
+import argparse
+import instrument
+from scan_tree import scan_tree, scan_tree_parallel
+from tree_index import open_index
 
-def list_files_in_directory(directory):
+def list_files_in_directory(directory, workers=1, sort=False, use_processes=False, use_index=False):
     """ This function takes a directory path and writes a CSV file with filenames,
         their extension, and size in bytes in that directory.
+        With workers > 1 the top-level subfolders are scanned in parallel, by threads or
+        by processes if use_processes is set. sort=True orders rows by folder and file name.
+        With use_index, rows come from the directory's SQLite tree index after a refresh.
     """
     try:
         # Normalize the directory path
@@ -28,24 +34,40 @@ def list_files_in_directory(directory):
             writer = csv.writer(file)
             writer.writerow(['Folder', 'File Name', 'File Type', 'Size (bytes)'])  # Header row
             
-            # Walk through the user-provided directory
-            for root, dirs, files in os.walk(directory):
-                for filename in files:
-                    filepath = os.path.join(root, filename)
-                    folder = root.split(directory)[-1]
-                    file_extension = os.path.splitext(filename)[1]
-                    file_size = os.path.getsize(filepath)
-                    writer.writerow([folder, filename, file_extension, file_size])
+            # Walk through the user-provided directory, reusing each entry's stat data
+            index = open_index(directory) if use_index else None
+            try:
+                if index is not None:
+                    records = index.iter_records()
+                elif workers > 1 or sort:
+                    records = scan_tree_parallel(directory, max(workers, 1), sort=sort, use_processes=use_processes)
+                else:
+                    records = scan_tree(directory)
+
+                for record in instrument.timed_iter(records, 'walk', 'files'):
+                    folder = os.sep + record.folder if record.folder else ''
+                    writer.writerow([folder, record.name, record.extension, record.size])
+            finally:
+                if index is not None:
+                    index.close()
                     
         print(f"CSV file has been created: {output_file}")
     except Exception as e:
         print(f"Error: {e}")
 
 def main():
-    if len(sys.argv) > 1:
+    instrument.profile_from_argv('dir_to_csv')
+    parser = argparse.ArgumentParser(description="Write a CSV listing every file in a directory tree")
+    parser.add_argument("directory", nargs="?", help="Directory to list (prompts if omitted)")
+    parser.add_argument("--workers", type=int, default=1, help="Scan top-level subfolders with this many workers")
+    parser.add_argument("--processes", action="store_true", help="Use worker processes instead of threads")
+    parser.add_argument("--sort", action="store_true", help="Sort rows by folder and file name")
+    parser.add_argument("--index", action="store_true", help="Answer from the SQLite tree index, refreshing it first")
+    args = parser.parse_args()
+
+    if args.directory:
         # Use the absolute path directly if provided via command line
-        directory = sys.argv[1]
-        list_files_in_directory(directory)
+        list_files_in_directory(args.directory, args.workers, args.sort, args.processes, args.index)
     else:
         # Interactive mode: ask the user to input the directory path
         while True:
@@ -55,7 +77,7 @@ def main():
             # Use the path as is if it's absolute, otherwise join it with the current working directory
             if not os.path.isabs(user_input_directory):
                 user_input_directory = os.path.join(os.getcwd(), user_input_directory)
-            list_files_in_directory(user_input_directory)
+            list_files_in_directory(user_input_directory, args.workers, args.sort, args.processes, args.index)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,14 @@
 import os
+import io
 import sys
+import json
+import codecs
+import instrument
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+from tree_index import open_index
 
 def should_exclude_path(path, excluded_folders, excluded_extensions):
     """
@@ -50,8 +58,375 @@ def get_default_excluded_extensions():
         '.o', '.obj'                      # Object files
     }
 
+def iter_rglob_files(directory, excluded_folders, excluded_extensions, stats):
+    """
+    Yield files to scrape by checking every path found by rglob.
+    
+    Args:
+        directory (Path): Root directory to scan
+        excluded_folders (set): Set of folder names to exclude
+        excluded_extensions (set): Set of file extensions to exclude
+        stats (dict): Statistics dict, 'skipped_files' is updated in place
+    
+    Yields:
+        Path: Files that are not excluded
+    """
+    for file_path in directory.rglob('*'):
+        if should_exclude_path(file_path, excluded_folders, excluded_extensions):
+            stats['skipped_files'] += 1
+            continue
+            
+        if file_path.is_file():
+            yield file_path
+
+def iter_pruned_files(directory, excluded_folders, excluded_extensions, stats):
+    """
+    Yield files to scrape, skipping excluded folders as soon as they are reached.
+    
+    Excluded folders are never entered, so their contents are not listed or counted
+    as skipped files. Files come out in the same order as rglob: a folder's files
+    first, then each subfolder in turn.
+    
+    Args:
+        directory (Path): Root directory to scan
+        excluded_folders (set): Set of folder names to exclude
+        excluded_extensions (set): Set of file extensions to exclude
+        stats (dict): Statistics dict, 'skipped_files', 'visited_dirs' and
+            'pruned_dirs' are updated in place
+    
+    Yields:
+        Path: Files that are not excluded
+    """
+    stats.setdefault('visited_dirs', 0)
+    stats.setdefault('pruned_dirs', 0)
+    stack = [str(directory)]
+    
+    while stack:
+        current = stack.pop()
+        stats['visited_dirs'] += 1
+        try:
+            with os.scandir(current) as entries:
+                entries = list(entries)
+        except OSError:
+            continue
+        
+        subfolders = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name in excluded_folders:
+                    stats['pruned_dirs'] += 1
+                else:
+                    subfolders.append(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in excluded_extensions:
+                stats['skipped_files'] += 1
+            elif entry.is_file():
+                yield Path(entry.path)
+        
+        # Reverse so the first subfolder is popped and scanned next
+        stack.extend(reversed(subfolders))
+
+def iter_index_files(index, excluded_folders, excluded_extensions, stats):
+    """
+    Yield files to scrape from a refreshed tree index instead of walking the disk.
+    
+    Excluded folders are pruned and counted as in iter_pruned_files. Files come
+    out in the index's order: a folder's entries sorted by name, then each
+    subfolder in turn.
+    
+    Args:
+        index (TreeIndex): Refreshed index of the directory being scraped
+        excluded_folders (set): Set of folder names to exclude
+        excluded_extensions (set): Set of file extensions to exclude
+        stats (dict): Statistics dict, 'skipped_files', 'visited_dirs' and
+            'pruned_dirs' are updated in place
+    
+    Yields:
+        Path: Files that are not excluded
+    """
+    stats.setdefault('visited_dirs', 0)
+    stats.setdefault('pruned_dirs', 0)
+    stats['visited_dirs'] += 1
+    # Folders are listed before their contents, so a folder missing here is below a pruned one
+    walked_folders = {''}
+    
+    for record in index.iter_records(include_dirs=True):
+        if record.folder not in walked_folders:
+            continue
+        if record.is_dir:
+            if record.is_link:
+                continue
+            if record.name in excluded_folders:
+                stats['pruned_dirs'] += 1
+            else:
+                stats['visited_dirs'] += 1
+                walked_folders.add(os.path.join(record.folder, record.name))
+        elif record.extension.lower() in excluded_extensions:
+            stats['skipped_files'] += 1
+        else:
+            yield Path(record.path)
+
+def read_file_contents(file_path):
+    """
+    Read a file as UTF-8 text.
+    
+    Args:
+        file_path (Path): File to read
+    
+    Returns:
+        tuple: (content, None) on success, (None, exception) on failure
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as infile:
+            return infile.read(), None
+    except Exception as e:
+        return None, e
+
+class PartialRead:
+    """
+    The start of a file that is too large to hold in memory at once.
+    
+    The reader decodes the first chunk, and the writer streams the rest of the
+    file from disk in fixed-size chunks using the same decoder.
+    """
+    
+    def __init__(self, file_path, text, position, size, decoder, chunk_size, max_file_bytes):
+        self.file_path = file_path
+        self.text = text
+        self.position = position
+        self.size = size
+        self.decoder = decoder
+        self.chunk_size = chunk_size
+        self.max_file_bytes = max_file_bytes
+    
+    def write_to(self, outfile):
+        """Write the decoded start and stream the remainder, adding a marker if truncated."""
+        outfile.write(self.text)
+        position = self.position
+        truncated = False
+        
+        with open(self.file_path, 'rb') as infile:
+            infile.seek(position)
+            while True:
+                read_size = self.chunk_size
+                if self.max_file_bytes is not None:
+                    read_size = min(read_size, self.max_file_bytes - position)
+                    if read_size <= 0:
+                        truncated = bool(infile.read(1))
+                        break
+                data = infile.read(read_size)
+                if not data:
+                    break
+                outfile.write(self.decode(data, position))
+                position += len(data)
+        
+        if truncated:
+            # Drop any partial character left in the decoder at the cut-off point
+            outfile.write(f'\n[Truncated: wrote the first {self.max_file_bytes} of {self.size} bytes]')
+        else:
+            outfile.write(self.decode(b'', position, final=True))
+    
+    def decode(self, data, position, final=False):
+        """Decode a chunk, reporting decode errors at their offset in the whole file."""
+        buffered = len(self.decoder.getstate()[0])
+        try:
+            return self.decoder.decode(data, final=final)
+        except UnicodeDecodeError as e:
+            # Same message as a whole-file decode, with the position counted from the file start
+            start = position - buffered + e.start
+            end = position - buffered + e.end
+            if e.end == e.start + 1:
+                where = f"byte 0x{e.object[e.start]:02x} in position {start}"
+            else:
+                where = f"bytes in position {start}-{end - 1}"
+            raise ValueError(f"'{e.encoding}' codec can't decode {where}: {e.reason}") from e
+
+def new_text_decoder():
+    """Returns an incremental UTF-8 decoder that translates newlines like text mode"""
+    return io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(), translate=True)
+
+def read_file_streaming(file_path, chunk_size, max_file_bytes=None, sniff_size=8192):
+    """
+    Read at most one chunk of a file, leaving anything larger to be streamed.
+    
+    Only the first sniff_size bytes are read before checking for binary content,
+    and files with a NUL byte in them are rejected without reading further.
+    Invalid UTF-8 in the first chunk is reported with the same error as a full read.
+    
+    Args:
+        file_path (Path): File to read
+        chunk_size (int): Maximum number of bytes read here
+        max_file_bytes (int): Maximum number of bytes written for the file, or None
+        sniff_size (int): Number of leading bytes checked for binary content
+    
+    Returns:
+        tuple: (content, None) on success, where content is a str for files that
+            fit in one chunk and a PartialRead otherwise; (None, exception) on failure
+    """
+    try:
+        with open(file_path, 'rb') as infile:
+            size = os.fstat(infile.fileno()).st_size
+            limit = chunk_size if max_file_bytes is None else min(chunk_size, max_file_bytes)
+            data = infile.read(min(sniff_size, limit))
+            if b'\0' in data:
+                raise ValueError('binary content detected')
+            if len(data) < limit:
+                data += infile.read(limit - len(data))
+        
+        decoder = new_text_decoder()
+        if len(data) < limit or size <= len(data):
+            return decoder.decode(data, final=True), None
+        
+        text = decoder.decode(data)
+        return PartialRead(file_path, text, len(data), size, decoder, chunk_size, max_file_bytes), None
+    except Exception as e:
+        return None, e
+
+def iter_prefetched_contents(files, workers, max_in_flight, read=read_file_contents):
+    """
+    Read files on a pool of threads while keeping them in their original order.
+    
+    At most max_in_flight files are read ahead of the one waiting to be written,
+    which bounds the memory held by prefetched contents.
+    
+    Args:
+        files (iterable): Paths to read, in output order
+        workers (int): Number of reader threads
+        max_in_flight (int): Maximum number of files read ahead of the writer
+        read (callable): Function returning a result tuple for one path
+    
+    Yields:
+        tuple: (file_path, *read(file_path)) in the same order as files
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for file_path in files:
+            pending.append((file_path, executor.submit(read, file_path)))
+            if len(pending) >= max_in_flight:
+                file_path, future = pending.popleft()
+                yield (file_path, *future.result())
+        
+        while pending:
+            file_path, future = pending.popleft()
+            yield (file_path, *future.result())
+
+def read_changed_file(file_path, previous_files, read=read_file_contents):
+    """
+    Read a file unless the previous manifest shows it is unchanged.
+    
+    Args:
+        file_path (Path): File to read
+        previous_files (dict): Manifest entries from the last run, keyed by path
+        read (callable): Function returning (content, error) for changed files
+    
+    Returns:
+        tuple: (content, error, signature, reused) where signature is
+            [size, mtime_ns] and reused is the previous manifest entry when the
+            file is unchanged. content and error are None for reused files
+    """
+    try:
+        stat = os.stat(file_path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        signature = None
+    
+    entry = previous_files.get(str(file_path))
+    if signature is not None and entry is not None and entry[:2] == signature:
+        return None, None, signature, entry
+    
+    return (*read(file_path), signature, None)
+
+class CountingWriter:
+    """Write text as UTF-8 to a binary file and track the current byte offset."""
+    
+    def __init__(self, raw):
+        self.raw = raw
+        self.offset = 0
+    
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.raw.write(data)
+        self.offset += len(data)
+    
+    def copy_from(self, source, offset, length, chunk_size=1024 * 1024):
+        """Copy length bytes starting at offset in source straight to the output."""
+        source.seek(offset)
+        remaining = length
+        while remaining:
+            chunk = source.read(min(chunk_size, remaining))
+            if not chunk:
+                raise OSError(f'Previous output ended early at byte {offset + length - remaining}')
+            self.raw.write(chunk)
+            remaining -= len(chunk)
+        self.offset += length
+
+def manifest_path_for(output_file):
+    """Returns the manifest path stored next to an output file"""
+    return f'{output_file}.manifest.json'
+
+def load_manifest(output_file, header, settings=None):
+    """
+    Load the manifest from the last incremental run, if it is still usable.
+    
+    The manifest is ignored if the scan settings changed or the previous
+    output no longer has the size recorded when it was written.
+    
+    Args:
+        output_file (str): Path to the output file
+        header (str): Header text for the current scan
+        settings (dict): Read settings that change the output but not the header,
+            such as max_file_bytes; sections written under other settings are not reused
+    
+    Returns:
+        dict: Manifest entries keyed by path, empty if nothing can be reused
+    """
+    try:
+        with open(manifest_path_for(output_file), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('header') != header or manifest.get('settings') != settings:
+            return {}
+        if manifest.get('output_size') != os.path.getsize(output_file):
+            return {}
+        return manifest.get('files', {})
+    except (OSError, ValueError):
+        return {}
+
+def write_file_section(outfile, file_path, content, error, stats):
+    """
+    Write one file's banner followed by its contents or the read error.
+    
+    Args:
+        outfile (file): Output file opened for writing
+        file_path (Path): Path shown in the banner
+        content (str): File contents, a PartialRead to stream, or None if reading failed
+        error (Exception): Read error, or None if reading succeeded
+        stats (dict): Statistics dict, updated in place
+    """
+    # Write file path as a header
+    outfile.write(format_banner(file_path))
+    
+    if error is None and isinstance(content, PartialRead):
+        try:
+            content.write_to(outfile)
+        except Exception as e:
+            # Part of the file is already written, so start the error on a new line
+            outfile.write('\n')
+            error = e
+        else:
+            content = ''
+    
+    if error is not None:
+        outfile.write(f'Error reading file {file_path}: {str(error)}\n')
+        stats['errors'] += 1
+        return
+    
+    outfile.write(content)
+    outfile.write('\n')
+    stats['processed_files'] += 1
+
 def scrape_directory(directory_path, output_file, additional_excluded_folders=None, 
-                    additional_excluded_extensions=None):
+                    additional_excluded_extensions=None, prune=False, workers=1,
+                    max_in_flight=None, incremental=False, chunk_size=None,
+                    max_file_bytes=None, max_shard_bytes=None, index=None):
     """
     Recursively scrape all files in a directory and write their contents to a single file.
     
@@ -60,6 +435,26 @@ def scrape_directory(directory_path, output_file, additional_excluded_folders=No
         output_file (str): Path to the output file
         additional_excluded_folders (set): Additional folder names to exclude
         additional_excluded_extensions (set): Additional file extensions to exclude
+        prune (bool): If True, skip excluded folders without descending into them
+            and report visited/pruned directory counts in the summary
+        workers (int): Number of threads reading files. 1 reads and writes each
+            file in turn; more prefetch contents while output order is kept
+        max_in_flight (int): Maximum number of files read ahead of the writer
+            when workers > 1. Defaults to four per worker
+        incremental (bool): If True, keep a manifest next to the output and copy
+            unchanged files from the previous output instead of reading them again
+        chunk_size (int): If set, copy file contents in chunks of this many bytes
+            and sniff only the first few KB for binary content, so memory use
+            does not grow with file size
+        max_file_bytes (int): Maximum bytes written per file, larger files end
+            with a truncation marker. Implies chunked copying
+        max_shard_bytes (int): If set, write numbered shards of at most this many
+            bytes instead of one output file. See scrape_sharded
+        index (TreeIndex): If given, list files from this refreshed tree index
+            instead of walking the directory. Excluded folders are pruned as with prune
+    
+    Returns:
+        dict: Scan statistics
     """
     # Combine default and additional exclusions
     excluded_folders = get_default_excluded_folders()
@@ -81,48 +476,272 @@ def scrape_directory(directory_path, output_file, additional_excluded_folders=No
         'errors': 0
     }
     
+    header = format_header(directory, excluded_folders, excluded_extensions)
+    
+    streaming = bool(chunk_size or max_file_bytes)
+    if streaming:
+        read = partial(read_file_streaming, chunk_size=chunk_size or 1024 * 1024,
+                       max_file_bytes=max_file_bytes)
+    else:
+        read = read_file_contents
+    # Streaming rejects files by sniffing and may truncate them, so reused sections must match
+    read_settings = {'streaming': streaming, 'max_file_bytes': max_file_bytes}
+    read = instrument.timed(read, 'read')
+    
+    # Iterate through all files in directory and subdirectories
+    if index is not None:
+        prune = True
+        files = iter_index_files(index, excluded_folders, excluded_extensions, stats)
+    elif prune:
+        files = iter_pruned_files(directory, excluded_folders, excluded_extensions, stats)
+    else:
+        files = iter_rglob_files(directory, excluded_folders, excluded_extensions, stats)
+    files = instrument.timed_iter(files, 'walk', 'files')
+    
+    if incremental:
+        if max_shard_bytes:
+            raise ValueError('Incremental mode writes a single output file and cannot be sharded')
+        scrape_incremental(files, output_file, header, stats, prune, workers, max_in_flight, read,
+                           read_settings)
+        return stats
+    
+    if workers > 1:
+        # Readers prefetch contents in parallel, this thread writes them in order
+        results = iter_prefetched_contents(files, workers, max_in_flight or workers * 4, read)
+    else:
+        results = ((file_path, *read(file_path)) for file_path in files)
+    
+    if max_shard_bytes:
+        stats['shards'] = scrape_sharded(results, output_file, header, stats, prune, max_shard_bytes)
+        return stats
+    
     # Create or open the output file in write mode
+    write_section = instrument.timed(write_file_section, 'write')
     with open(output_file, 'w', encoding='utf-8') as outfile:
         # Write header with scanning information
-        outfile.write(f'Directory Scan Results\n')
-        outfile.write(f'{"="*80}\n')
-        outfile.write(f'Source Directory: {directory}\n')
-        outfile.write(f'Excluded Folders: {sorted(excluded_folders)}\n')
-        outfile.write(f'Excluded Extensions: {sorted(excluded_extensions)}\n\n')
+        outfile.write(header)
         
-        # Iterate through all files in directory and subdirectories
-        for file_path in directory.rglob('*'):
-            if should_exclude_path(file_path, excluded_folders, excluded_extensions):
-                stats['skipped_files'] += 1
-                continue
-                
-            if file_path.is_file():
-                try:
-                    # Write file path as a header
-                    outfile.write(f'\n{"="*80}\n')
-                    outfile.write(f'File: {file_path}\n')
-                    outfile.write(f'{"="*80}\n\n')
-                    
-                    # Read and write the file contents
-                    with open(file_path, 'r', encoding='utf-8') as infile:
-                        content = infile.read()
-                        outfile.write(content)
-                        outfile.write('\n')
-                        
+        for file_path, content, error in results:
+            write_section(outfile, file_path, content, error, stats)
+        
+        write_summary(outfile, stats, prune)
+    
+    if instrument.enabled():
+        instrument.count('bytes', os.path.getsize(output_file))
+    return stats
+
+def scrape_incremental(files, output_file, header, stats, prune, workers, max_in_flight,
+                       read_changed=read_file_contents, read_settings=None):
+    """
+    Write the scan output, copying unchanged file sections from the previous run.
+    
+    A manifest of path, size, mtime and output offset/length is kept next to the
+    output. Files whose size and mtime match are copied from the previous output
+    in bulk, adjacent sections in a single copy, and only new or changed files are
+    read. The result is identical to a full scan.
+    
+    Args:
+        files (iterable): Paths to write, in output order
+        output_file (str): Path to the output file
+        header (str): Header text for the scan
+        stats (dict): Statistics dict, updated in place
+        prune (bool): Whether directory counts are included in the summary
+        workers (int): Number of threads reading files
+        max_in_flight (int): Maximum number of files read ahead of the writer
+        read_changed (callable): Function returning (content, error) for changed files
+        read_settings (dict): Settings of read_changed that affect the output, stored
+            in the manifest so a run with different settings reads every file again
+    """
+    previous_files = load_manifest(output_file, header, read_settings)
+    read = partial(read_changed_file, previous_files=previous_files, read=read_changed)
+    
+    if workers > 1:
+        results = iter_prefetched_contents(files, workers, max_in_flight or workers * 4, read)
+    else:
+        results = ((file_path, *read(file_path)) for file_path in files)
+    
+    stats['reused_files'] = 0
+    manifest_files = {}
+    temp_output = f'{output_file}.tmp'
+    previous = open(output_file, 'rb') if previous_files else None
+    
+    try:
+        with open(temp_output, 'wb') as raw:
+            outfile = CountingWriter(raw)
+            outfile.write(header)
+            
+            # Pending run of reused bytes as [offset, length] in the previous output
+            pending_copy = None
+            
+            for file_path, content, error, signature, reused in results:
+                if reused is not None:
+                    offset, length = reused[2], reused[3]
+                    if pending_copy and pending_copy[0] + pending_copy[1] == offset:
+                        pending_copy[1] += length
+                    else:
+                        if pending_copy:
+                            outfile.copy_from(previous, *pending_copy)
+                        pending_copy = [offset, length]
+                    manifest_files[str(file_path)] = signature + [outfile.offset + pending_copy[1] - length, length]
                     stats['processed_files'] += 1
-                        
-                except Exception as e:
-                    outfile.write(f'Error reading file {file_path}: {str(e)}\n')
-                    stats['errors'] += 1
+                    stats['reused_files'] += 1
                     continue
+                
+                if pending_copy:
+                    outfile.copy_from(previous, *pending_copy)
+                    pending_copy = None
+                
+                start = outfile.offset
+                write_file_section(outfile, file_path, content, error, stats)
+                # Only successfully read files are reused, errors are retried next run
+                if error is None and signature is not None:
+                    manifest_files[str(file_path)] = signature + [start, outfile.offset - start]
+            
+            if pending_copy:
+                outfile.copy_from(previous, *pending_copy)
+            
+            write_summary(outfile, stats, prune)
+            output_size = outfile.offset
+    finally:
+        if previous:
+            previous.close()
+    
+    os.replace(temp_output, output_file)
+    
+    manifest = {
+        'header': header,
+        'settings': read_settings,
+        'output_size': output_size,
+        'files': manifest_files
+    }
+    temp_manifest = f'{manifest_path_for(output_file)}.tmp'
+    with open(temp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(temp_manifest, manifest_path_for(output_file))
+
+# Room kept free in every shard for the index heading and the scan summary,
+# since any shard may be the last
+SHARD_INDEX_BASE_BYTES = 256
+SUMMARY_RESERVE_BYTES = 512
+
+def format_banner(file_path):
+    """Returns the banner written before each file's contents"""
+    return f'\n{"="*80}\nFile: {file_path}\n{"="*80}\n\n'
+
+def estimate_section_bytes(file_path, content, error):
+    """
+    Estimate the bytes write_file_section will write for one file.
+    
+    Exact for files already read into memory. For a PartialRead the file's size on
+    disk is used, which newline translation can only shrink.
+    
+    Returns:
+        int: Estimated size of the section in bytes
+    """
+    size = len(format_banner(file_path).encode('utf-8'))
+    if error is not None:
+        return size + len(f'Error reading file {file_path}: {str(error)}\n'.encode('utf-8'))
+    if isinstance(content, PartialRead):
+        remaining = content.size if content.max_file_bytes is None else min(content.size, content.max_file_bytes)
+        return size + remaining + 80
+    return size + (len(content) if content.isascii() else len(content.encode('utf-8'))) + 1
+
+def shard_path_for(output_file, shard_number):
+    """Returns the path of a numbered shard, named like split_txt parts"""
+    base_name, extension = os.path.splitext(str(output_file))
+    return f'{base_name}_part{shard_number}{extension or ".txt"}'
+
+def write_shard_index(outfile, shard_number, shard_files):
+    """Write the list of files contained in a shard at the end of it"""
+    outfile.write(f'\n{"="*80}\n')
+    outfile.write(f'Shard {shard_number} Index\n')
+    outfile.write(f'{"="*80}\n')
+    outfile.write(f'Files in this shard: {len(shard_files)}\n')
+    for file_path in shard_files:
+        outfile.write(f'  {file_path}\n')
+
+def scrape_sharded(results, output_file, header, stats, prune, max_shard_bytes):
+    """
+    Write scan results into numbered shards of at most max_shard_bytes each.
+    
+    Shards only break between files, so no file's contents are split across two
+    shards. Every shard starts with the scan header and ends with an index of the
+    files it contains; the last shard also carries the scan summary. A single file
+    larger than the limit gets a shard of its own.
+    
+    Args:
+        results (iterable): (file_path, content, error) tuples in output order
+        output_file (str): Output path, shards are named <name>_part<N><ext>
+        header (str): Header text for the scan
+        stats (dict): Statistics dict, updated in place
+        prune (bool): Whether directory counts are included in the summary
+        max_shard_bytes (int): Maximum size of each shard in bytes
+    
+    Returns:
+        list: Paths of the shards written
+    """
+    shard_paths = []
+    shard_files = []
+    
+    def open_shard():
+        path = shard_path_for(output_file, len(shard_paths) + 1)
+        shard_paths.append(path)
+        writer = CountingWriter(open(path, 'wb'))
+        writer.write(header)
+        return writer
+    
+    outfile = open_shard()
+    reserved = SHARD_INDEX_BASE_BYTES + SUMMARY_RESERVE_BYTES
+    try:
+        for file_path, content, error in results:
+            section_bytes = estimate_section_bytes(file_path, content, error)
+            entry_bytes = len(f'  {file_path}\n'.encode('utf-8'))
+            if shard_files and outfile.offset + section_bytes + entry_bytes + reserved > max_shard_bytes:
+                write_shard_index(outfile, len(shard_paths), shard_files)
+                outfile.raw.close()
+                outfile = open_shard()
+                shard_files = []
+                reserved = SHARD_INDEX_BASE_BYTES + SUMMARY_RESERVE_BYTES
+            
+            write_file_section(outfile, file_path, content, error, stats)
+            shard_files.append(file_path)
+            reserved += entry_bytes
         
-        # Write summary at the end
-        outfile.write(f'\n{"="*80}\n')
-        outfile.write('Scan Summary\n')
-        outfile.write(f'{"="*80}\n')
-        outfile.write(f'Files Processed: {stats["processed_files"]}\n')
-        outfile.write(f'Files Skipped: {stats["skipped_files"]}\n')
-        outfile.write(f'Errors Encountered: {stats["errors"]}\n')
+        write_shard_index(outfile, len(shard_paths), shard_files)
+        write_summary(outfile, stats, prune)
+    finally:
+        outfile.raw.close()
+    
+    return shard_paths
+
+def format_header(directory, excluded_folders, excluded_extensions):
+    """Returns the header text written at the top of the output file"""
+    return (
+        f'Directory Scan Results\n'
+        f'{"="*80}\n'
+        f'Source Directory: {directory}\n'
+        f'Excluded Folders: {sorted(excluded_folders)}\n'
+        f'Excluded Extensions: {sorted(excluded_extensions)}\n\n'
+    )
+
+def write_summary(outfile, stats, prune):
+    """
+    Write the scan summary at the end of the output file.
+    
+    Args:
+        outfile (file): Output file opened for writing
+        stats (dict): Statistics dict
+        prune (bool): Whether to include visited/pruned directory counts
+    """
+    outfile.write(f'\n{"="*80}\n')
+    outfile.write('Scan Summary\n')
+    outfile.write(f'{"="*80}\n')
+    outfile.write(f'Files Processed: {stats["processed_files"]}\n')
+    outfile.write(f'Files Skipped: {stats["skipped_files"]}\n')
+    outfile.write(f'Errors Encountered: {stats["errors"]}\n')
+    if prune:
+        outfile.write(f'Directories Visited: {stats["visited_dirs"]}\n')
+        outfile.write(f'Directories Pruned: {stats["pruned_dirs"]}\n')
 
 
 def GetArgument(prompt: str, arg_no: int) -> str:
@@ -135,11 +754,17 @@ def GetArgument(prompt: str, arg_no: int) -> str:
 
 
 def main():
+    instrument.profile_from_argv('dir_to_file')
     # Example usage
     filename_prefix = GetArgument("File prefix: ", 1)
     directory_to_scrape = os.getcwd()
     folder = directory_to_scrape.split("/")
     output_file_path = f"/home/siwhyatt/Downloads/{filename_prefix}_{folder[-1]}_content.txt"
+    # "--index" lists files from the tree index instead of walking the directory
+    use_index = '--index' in sys.argv[1:]
+    sys.argv[1:] = [arg for arg in sys.argv[1:] if arg != '--index']
+    # Optional second argument: write shards of at most this many MB instead of one file
+    shard_size_mb = float(sys.argv[2]) if len(sys.argv) > 2 else None
     
     # Optional: Add more folders or extensions to exclude
     # These will be added to the default exclusions, not replace them
@@ -154,16 +779,31 @@ def main():
         '.json'
     }
     
+    index = None
     try:
-        scrape_directory(
+        index = open_index(directory_to_scrape) if use_index else None
+        stats = scrape_directory(
             directory_to_scrape,
             output_file_path,
             additional_excluded_folders,
-            additional_excluded_extensions
+            additional_excluded_extensions,
+            prune=True,
+            workers=8,
+            incremental=shard_size_mb is None,
+            chunk_size=1024 * 1024,
+            max_shard_bytes=int(shard_size_mb * 1024 * 1024) if shard_size_mb else None,
+            index=index
         )
-        print(f"Successfully created {output_file_path}")
+        if shard_size_mb:
+            for shard_path in stats['shards']:
+                print(f"Successfully created {shard_path}")
+        else:
+            print(f"Successfully created {output_file_path}")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+    finally:
+        if index is not None:
+            index.close()
 
 if __name__ == "__main__":
     main()
@@ -6,39 +6,334 @@ A script to recursively delete files matching a regex pattern from a directory t
 
 import os
 import re
+import sys
+import time
+import heapq
 import argparse
+import instrument
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from tree_index import open_index
 
 
-def find_matching_files(directory, pattern):
+# Seconds between progress updates while streaming
+PROGRESS_INTERVAL = 0.5
+
+# Deleting is bound by filesystem latency rather than CPU, so threads overlap the waits
+DELETE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Files from one folder handed to a worker at a time
+DELETE_BATCH = 256
+# Whether unlink can work relative to an open folder instead of resolving every full path
+UNLINK_DIR_FD = os.unlink in os.supports_dir_fd
+
+# Characters that make a regex more than plain text
+REGEX_SPECIAL = set('.^$*+?{}[]|()\\')
+
+
+def _ends_with_unescaped(text, suffix):
+    # True if text ends with suffix and the suffix's first character is not escaped
+    if not text.endswith(suffix):
+        return False
+    stem = text[:-len(suffix)]
+    return (len(stem) - len(stem.rstrip('\\'))) % 2 == 0
+
+
+def _literal(text):
+    # The plain string a regex fragment matches, or None if it uses any regex syntax
+    chars = []
+    position = 0
+    while position < len(text):
+        char = text[position]
+        if char == '\\':
+            escaped = text[position + 1:position + 2]
+            if not escaped or escaped.isascii() and escaped.isalnum():
+                return None  # \d, \w, \1 and friends are classes or references
+            chars.append(escaped)
+            position += 2
+            continue
+        if char in REGEX_SPECIAL:
+            return None
+        chars.append(char)
+        position += 1
+    return ''.join(chars)
+
+
+def _fast_path(pattern):
+    # Classify a pattern, as used with re.match, as a plain string test if it is one:
+    # "^\._" is a prefix, ".*\.tmp$" a suffix, "Thumbs\.db$" exact and ".*~" contains
+    body = pattern[1:] if pattern.startswith('^') else pattern
+    anywhere = body.startswith('.*')
+    if anywhere:
+        body = body[2:]
+    anchored_end = _ends_with_unescaped(body, '$')
+    if anchored_end:
+        body = body[:-1]
+    elif _ends_with_unescaped(body, '.*'):
+        body = body[:-2]
+    literal = _literal(body)
+    if not literal:
+        return None
+    if anywhere:
+        return ('suffix' if anchored_end else 'contains'), literal
+    return ('exact' if anchored_end else 'prefix'), literal
+
+
+class NameMatcher:
     """
-    Find all files that match the given regex pattern.
+    Match names against many regex patterns at once, each used like re.match.
+    
+    Patterns that are really plain text (prefixes, suffixes, exact names and
+    substrings) are checked with str methods and a set lookup; the rest are
+    joined into a single alternation. Names containing a newline, where "." and
+    "$" behave differently, always go through the full regexes.
     
     Args:
-        directory (str): Root directory to search
-        pattern (str): Regex pattern to match filenames
+        patterns (list): Regex patterns; a name matching any of them matches
+    """
+    
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.compiled = [re.compile(pattern) for pattern in self.patterns]
+        prefixes, suffixes, contains, others = [], [], [], []
+        self.exact = set()
+        
+        for pattern, compiled in zip(self.patterns, self.compiled):
+            fast = _fast_path(pattern)
+            if fast is None:
+                others.append(compiled)
+            elif fast[0] == 'prefix':
+                prefixes.append(fast[1])
+            elif fast[0] == 'suffix':
+                suffixes.append(fast[1])
+            elif fast[0] == 'contains':
+                contains.append(fast[1])
+            else:
+                self.exact.add(fast[1])
+        
+        self.prefixes = tuple(prefixes)
+        self.suffixes = tuple(suffixes)
+        self.contains = contains
+        
+        # Patterns with groups keep their own regex, so their group references stay valid
+        plain = [compiled.pattern for compiled in others if compiled.groups == 0]
+        self.regexes = [compiled for compiled in others if compiled.groups > 0]
+        if len(plain) > 1:
+            try:
+                self.regexes.append(re.compile('|'.join(f'(?:{pattern})' for pattern in plain)))
+            except re.error:
+                # Inline flags such as (?i) cannot be combined, match them one by one
+                self.regexes.extend(compiled for compiled in others if compiled.groups == 0)
+        elif plain:
+            self.regexes.extend(compiled for compiled in others if compiled.groups == 0)
+    
+    def match(self, name):
+        if '\n' in name:
+            return any(compiled.match(name) for compiled in self.compiled)
+        return bool(
+            name.startswith(self.prefixes)
+            or name.endswith(self.suffixes)
+            or name in self.exact
+            or any(part in name for part in self.contains)
+            or any(compiled.match(name) for compiled in self.regexes)
+        )
+
+
+def folder_filter(exclude_dirs=None, include_dirs=None):
+    """
+    Build a test for which subfolders the walk enters, or None if all of them.
+    
+    Args:
+        exclude_dirs (list): Folder name patterns never entered
+        include_dirs (list): If given, only folders whose name matches one of
+            these are entered, at every level below the root
     
     Returns:
-        list: List of Path objects for matching files
+        callable: Takes a folder name, returns True if it should be walked
+    """
+    if not exclude_dirs and not include_dirs:
+        return None
+    exclude = NameMatcher(exclude_dirs) if exclude_dirs else None
+    include = NameMatcher(include_dirs) if include_dirs else None
+    
+    def allowed(name):
+        if exclude is not None and exclude.match(name):
+            return False
+        return include is None or include.match(name)
+    return allowed
+
+
+def _iter_index_matches(index, patterns, matcher, allowed):
+    # A single pattern without folder rules is answered by the index's own REGEXP query
+    if len(patterns) == 1 and allowed is None:
+        for record in index.find_files(patterns[0]):
+            yield Path(record.path)
+        return
+    
+    # A folder is walked only if it and every folder above it pass the rules, as with pruning.
+    # Parents can have no files of their own, so each one is checked rather than assumed.
+    folder_allowed = {'': True}
+    
+    def is_allowed(folder):
+        if folder not in folder_allowed:
+            parent, name = os.path.split(folder)
+            folder_allowed[folder] = is_allowed(parent) and allowed(name)
+        return folder_allowed[folder]
+    
+    for record in index.iter_records():
+        if (allowed is None or is_allowed(record.folder)) and matcher.match(record.name):
+            yield Path(record.path)
+
+
+def iter_matching_files(directory, pattern, index=None, stats=None, exclude_dirs=None, include_dirs=None):
+    """
+    Yield files that match any of the given regex patterns as the walk finds them.
+    
+    Args:
+        directory (str): Root directory to search
+        pattern (str or list): Regex pattern, or patterns, to match filenames
+        index (TreeIndex): Refreshed tree index to query instead of walking
+        stats (dict): If given, its 'scanned' count is kept up to date with
+            the number of files looked at so far, and 'pruned' with the
+            number of folders skipped by the folder rules
+        exclude_dirs (list): Folder name patterns that are not walked into
+        include_dirs (list): If given, only folders whose name matches one of
+            these are walked into
+    
+    Yields:
+        Path: Each matching file
     """
-    compiled_pattern = re.compile(pattern)
-    matching_files = []
+    patterns = [pattern] if isinstance(pattern, str) else list(pattern)
+    matcher = NameMatcher(patterns)
+    allowed = folder_filter(exclude_dirs, include_dirs)
+    
+    if index is not None:
+        yield from _iter_index_matches(index, patterns, matcher, allowed)
+        return
     
     for root, dirs, files in os.walk(directory):
+        if allowed is not None:
+            # Pruning in place stops os.walk from descending into the folder at all
+            kept = [name for name in dirs if allowed(name)]
+            if stats is not None:
+                stats['pruned'] = stats.get('pruned', 0) + len(dirs) - len(kept)
+            dirs[:] = kept
+        instrument.count('files', len(files))
+        if stats is not None:
+            stats['scanned'] += len(files)
         for file in files:
-            if compiled_pattern.match(file):
-                matching_files.append(Path(root) / file)
+            if matcher.match(file):
+                yield Path(root) / file
+
+
+def find_matching_files(directory, pattern, index=None, exclude_dirs=None, include_dirs=None):
+    """
+    Find all files that match the given regex pattern, or any of several.
     
-    return matching_files
+    Args:
+        directory (str): Root directory to search
+        pattern (str or list): Regex pattern, or patterns, to match filenames
+        index (TreeIndex): Refreshed tree index to query instead of walking
+        exclude_dirs (list): Folder name patterns that are not searched
+        include_dirs (list): If given, only folders matching one of these are searched
+    
+    Returns:
+        list: List of Path objects for matching files
+    """
+    return list(iter_matching_files(directory, pattern, index, None, exclude_dirs, include_dirs))
 
 
-def delete_files(file_list, dry_run=False):
+class Progress:
+    """
+    Single status line on stderr, redrawn at most every interval seconds.
+    
+    Args:
+        describe (callable): Returns the current status text
+        interval (float): Minimum seconds between redraws
+    """
+    
+    def __init__(self, describe, interval=PROGRESS_INTERVAL):
+        self.describe = describe
+        self.interval = interval
+        self.next_update = time.monotonic() + interval
+        self.shown = False
+    
+    def update(self, *args):
+        now = time.monotonic()
+        if now >= self.next_update:
+            self.next_update = now + self.interval
+            self.shown = True
+            sys.stderr.write(f"\r{self.describe()}")
+            sys.stderr.flush()
+    
+    def finish(self):
+        # Leave the final counts on screen if a status line was drawn
+        if self.shown:
+            sys.stderr.write(f"\r{self.describe()}\n")
+            sys.stderr.flush()
+
+
+def _iter_batches(file_list):
+    # Group consecutive files from the same folder, as the walk yields them, into batches
+    directory, names = None, []
+    for file_path in file_list:
+        parent, name = os.path.split(os.fspath(file_path))
+        if parent != directory or len(names) >= DELETE_BATCH:
+            if names:
+                yield directory, names
+            directory, names = parent, []
+        names.append(name)
+    if names:
+        yield directory, names
+
+
+def _delete_batch(directory, names, dry_run):
+    # Unlink names relative to one open handle on their folder, so its path is resolved once.
+    # Returns (name, error) pairs, with None for each file deleted.
+    if dry_run:
+        return [(name, None) for name in names]
+    
+    dir_fd = None
+    if UNLINK_DIR_FD:
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+        except OSError:
+            pass  # Full paths below report the error for each file
+    
+    results = []
+    try:
+        for name in names:
+            try:
+                if dir_fd is None:
+                    os.unlink(os.path.join(directory, name))
+                else:
+                    os.unlink(name, dir_fd=dir_fd)
+                results.append((name, None))
+            except Exception as e:
+                results.append((name, e))
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    return results
+
+
+def delete_files(file_list, dry_run=False, verbose=True, progress=None, workers=1, folders=None):
     """
     Delete files from the provided list.
     
+    Files are deleted a folder at a time, relative to an open handle on the
+    folder, and with several workers folders are deleted from concurrently.
+    Results are still reported in the order the files arrive.
+    
     Args:
-        file_list (list): List of Path objects to delete
+        file_list (iterable): Path objects to delete, a list or a generator
+            such as iter_matching_files, which is consumed as it goes
         dry_run (bool): If True, only print what would be deleted
+        verbose (bool): If True, print every file; failures are always printed
+        progress (callable): Called with (successful, failed) after each file
+        workers (int): Number of threads deleting at once
+        folders (dict): If given, filled with folder -> number of files
+            deleted from it, for remove_empty_folders
     
     Returns:
         tuple: (successful_deletions, failed_deletions)
@@ -46,24 +341,111 @@ def delete_files(file_list, dry_run=False):
     successful = 0
     failed = 0
     
-    for file_path in file_list:
-        try:
-            if dry_run:
-                print(f"Would delete: {file_path}")
+    def report(directory, results):
+        nonlocal successful, failed
+        deleted = 0
+        for name, error in results:
+            if error is None:
+                if verbose:
+                    print(f"{'Would delete' if dry_run else 'Deleted'}: {os.path.join(directory, name)}")
+                successful += 1
+                deleted += 1
             else:
-                file_path.unlink()
-                print(f"Deleted: {file_path}")
-            successful += 1
-        except Exception as e:
-            print(f"Failed to delete {file_path}: {e}")
-            failed += 1
+                print(f"Failed to delete {os.path.join(directory, name)}: {error}")
+                failed += 1
+            if progress is not None:
+                progress(successful, failed)
+        if folders is not None and deleted:
+            folders[directory] = folders.get(directory, 0) + deleted
+    
+    batches = _iter_batches(file_list)
+    if workers <= 1:
+        for directory, names in batches:
+            report(directory, _delete_batch(directory, names, dry_run))
+        return successful, failed
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for directory, names in batches:
+            pending.append((directory, executor.submit(_delete_batch, directory, names, dry_run)))
+            # Keep only a few batches queued, so a long walk is not buffered ahead of the deletions
+            while len(pending) > 2 * workers:
+                directory, future = pending.popleft()
+                report(directory, future.result())
+        while pending:
+            directory, future = pending.popleft()
+            report(directory, future.result())
     
     return successful, failed
 
 
+def _entry_count(folder):
+    try:
+        with os.scandir(folder) as entries:
+            return sum(1 for _ in entries)
+    except OSError:
+        return -1
+
+
+def remove_empty_folders(folders, root, dry_run=False, verbose=True):
+    """
+    Remove folders left empty by delete_files, deepest first, then any parent
+    folders that removing them leaves empty, up to but not including root.
+    
+    Args:
+        folders (dict): Folder -> number of files deleted from it, as filled
+            in by delete_files
+        root (str): Directory the search started from, which is never removed
+        dry_run (bool): If True, only print what would be removed, counting
+            the files a real run would have deleted as already gone
+        verbose (bool): If True, print every folder; failures are always printed
+    
+    Returns:
+        int: Number of folders removed, or that would be removed
+    """
+    root = Path(os.path.abspath(root))
+    deleted = {Path(os.path.abspath(folder)): count for folder, count in folders.items()}
+    removed_below = {}
+    removed = 0
+    
+    # Deepest folders first, so a parent is only looked at once all its children are done
+    heap = [(-len(folder.parts), str(folder), folder) for folder in deleted if root in folder.parents]
+    heapq.heapify(heap)
+    queued = {folder for _, _, folder in heap}
+    
+    while heap:
+        _, _, folder = heapq.heappop(heap)
+        # In a dry run nothing is gone yet, so the folder is empty if it only holds what would be removed
+        gone = deleted.get(folder, 0) + removed_below.get(folder, 0) if dry_run else 0
+        if _entry_count(folder) != gone:
+            continue
+        
+        if dry_run:
+            if verbose:
+                print(f"Would remove empty folder: {folder}")
+        else:
+            try:
+                os.rmdir(folder)
+            except OSError as e:
+                print(f"Failed to remove folder {folder}: {e}")
+                continue
+            if verbose:
+                print(f"Removed empty folder: {folder}")
+        removed += 1
+        
+        parent = folder.parent
+        removed_below[parent] = removed_below.get(parent, 0) + 1
+        if root in parent.parents and parent not in queued:
+            queued.add(parent)
+            heapq.heappush(heap, (-len(parent.parts), str(parent), parent))
+    
+    return removed
+
+
 def main():
+    instrument.profile_from_argv('directory_cleaner')
     parser = argparse.ArgumentParser(
-        description="Recursively delete files matching a regex pattern",
+        description="Recursively delete files matching one or more regex patterns",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
@@ -73,8 +455,15 @@ Examples:
   # Delete all .tmp files
   python clean_directory.py /path/to/folder ".*\.tmp$"
   
-  # Dry run to see what would be deleted
+  # Dry run to list what would be deleted
   python clean_directory.py /path/to/folder "^\._.*" --dry-run
+  
+  # Dry run that only counts the matches
+  python clean_directory.py /path/to/folder "^\._.*" --dry-run --quiet
+  
+  # All the usual junk in one pass, skipping .git and node_modules folders
+  python clean_directory.py /path/to/folder "^\._" "\.DS_Store$" "Thumbs\.db$" ".*~$" \
+      --exclude-dir "\.git$" --exclude-dir "node_modules$"
         """
     )
     
@@ -84,69 +473,166 @@ Examples:
     )
     
     parser.add_argument(
-        "pattern",
-        help="Regex pattern to match filenames (e.g., '^\._.*' for files starting with ._)"
+        "patterns",
+        nargs="+",
+        metavar="pattern",
+        help="Regex pattern(s) to match filenames (e.g., '^\._.*' for files starting with ._); "
+             "a file matching any of them is deleted"
+    )
+    
+    parser.add_argument(
+        "--exclude-dir",
+        action="append",
+        metavar="PATTERN",
+        help="Skip folders whose name matches this regex, without walking into them (repeatable)"
+    )
+    
+    parser.add_argument(
+        "--include-dir",
+        action="append",
+        metavar="PATTERN",
+        help="Only walk into folders whose name matches this regex, at every level (repeatable)"
     )
     
     parser.add_argument(
         "--dry-run",
         action="store_true",
-        help="Show what would be deleted without actually deleting"
+        help="List every file that would be deleted, without deleting anything "
+             "(add --quiet for only a progress line and the summary)"
+    )
+    
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Find matches with the SQLite tree index, refreshing it first"
     )
     
     parser.add_argument(
         "--confirm",
         action="store_true",
-        help="Ask for confirmation before deleting files"
+        help="List the matches and ask for confirmation before deleting them"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DELETE_WORKERS,
+        help=f"Number of threads deleting files at once (default: {DELETE_WORKERS})"
+    )
+    
+    parser.add_argument(
+        "--remove-empty-dirs",
+        action="store_true",
+        help="Also remove folders left empty by the deletion, deepest first"
+    )
+    
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print every file as it is deleted instead of a progress line"
+    )
+    output.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Show only a progress line and the summary, even with --dry-run"
     )
     
     args = parser.parse_args()
+    # A dry run is for seeing what would go, so it lists every file unless asked not to
+    verbose = args.verbose or (args.dry_run and not args.quiet)
     
     # Validate directory
     if not os.path.isdir(args.directory):
         print(f"Error: '{args.directory}' is not a valid directory")
         return 1
     
-    # Validate regex pattern
-    try:
-        re.compile(args.pattern)
-    except re.error as e:
-        print(f"Error: Invalid regex pattern '{args.pattern}': {e}")
-        return 1
+    # Validate regex patterns
+    for pattern in args.patterns + (args.exclude_dir or []) + (args.include_dir or []):
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            print(f"Error: Invalid regex pattern '{pattern}': {e}")
+            return 1
     
-    print(f"Searching for files matching pattern: {args.pattern}")
+    print(f"Searching for files matching pattern: {', '.join(args.patterns)}")
     print(f"In directory: {args.directory}")
+    if args.exclude_dir:
+        print(f"Skipping folders matching: {', '.join(args.exclude_dir)}")
+    if args.include_dir:
+        print(f"Only folders matching: {', '.join(args.include_dir)}")
     print()
     
-    # Find matching files
-    matching_files = find_matching_files(args.directory, args.pattern)
+    index = open_index(args.directory) if args.index else None
+    try:
+        stats = {'scanned': 0, 'pruned': 0, 'successful': 0, 'failed': 0}
+        matches = instrument.timed_iter(
+            iter_matching_files(args.directory, args.patterns, index, stats, args.exclude_dir, args.include_dir),
+            'walk', 'matches'
+        )
+        
+        # Only confirmation needs the whole list up front, otherwise matches go straight to deletion
+        if args.confirm and not args.dry_run:
+            matching_files = list(matches)
+            if not matching_files:
+                print("No files found matching the pattern.")
+                return 0
+            
+            print(f"Found {len(matching_files)} files matching the pattern:")
+            for file_path in matching_files:
+                print(f"  {file_path}")
+            print()
+            
+            response = input(f"Are you sure you want to delete these {len(matching_files)} files? (y/N): ")
+            if response.lower() not in ['y', 'yes']:
+                print("Deletion cancelled.")
+                return 0
+            matches = matching_files
+        
+        action = "would delete" if args.dry_run else "deleted"
+        progress = Progress(lambda: (
+            f"Scanned {stats['scanned']} files, {action} {stats['successful']}, failed {stats['failed']}"
+        ))
+        
+        def update(successful, failed):
+            stats['successful'], stats['failed'] = successful, failed
+            progress.update()
+        
+        # Delete files
+        folders = {} if args.remove_empty_dirs else None
+        with instrument.phase('clean'):
+            successful, failed = delete_files(matches, args.dry_run, verbose,
+                                              None if verbose else update, args.workers, folders)
+        progress.finish()
+        instrument.count('deleted', successful)
+        
+        removed_folders = 0
+        if folders:
+            with instrument.phase('remove_dirs'):
+                removed_folders = remove_empty_folders(folders, args.directory, args.dry_run, verbose)
+    finally:
+        if index is not None:
+            index.close()
     
-    if not matching_files:
+    if successful + failed == 0:
         print("No files found matching the pattern.")
         return 0
     
-    print(f"Found {len(matching_files)} files matching the pattern:")
-    for file_path in matching_files:
-        print(f"  {file_path}")
-    print()
-    
-    # Confirm deletion if requested
-    if args.confirm and not args.dry_run:
-        response = input(f"Are you sure you want to delete these {len(matching_files)} files? (y/N): ")
-        if response.lower() not in ['y', 'yes']:
-            print("Deletion cancelled.")
-            return 0
-    
-    # Delete files
-    successful, failed = delete_files(matching_files, args.dry_run)
-    
     print(f"\nSummary:")
+    if index is None:
+        print(f"  Files scanned: {stats['scanned']}")
+        if args.exclude_dir or args.include_dir:
+            print(f"  Folders skipped: {stats['pruned']}")
     if args.dry_run:
         print(f"  Would delete: {successful} files")
         print(f"  Would fail: {failed} files")
+        if args.remove_empty_dirs:
+            print(f"  Would remove: {removed_folders} empty folders")
     else:
         print(f"  Successfully deleted: {successful} files")
         print(f"  Failed to delete: {failed} files")
+        if args.remove_empty_dirs:
+            print(f"  Removed: {removed_folders} empty folders")
     
     return 0
 
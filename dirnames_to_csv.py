@@ -1,8 +1,12 @@
 import os
 import csv
+import sys
+from scan_tree import scan_tree
+from tree_index import open_index
 
-def list_folders_in_directory():
+def list_folders_in_directory(use_index=False):
     """ This function writes a csv file with all the folder names in a directory
+        With use_index, folder names come from the directory's SQLite tree index.
     """
     directory = os.getcwd()
     # Define the path for the output CSV file
@@ -14,14 +18,18 @@ def list_folders_in_directory():
         writer.writerow(['Foldername'])  # Header row
         
         # Walk through the user-provided directory
-        for root, dirs, files in os.walk(directory):
-            for folder in dirs:
-                writer.writerow([ folder ])
+        if use_index:
+            with open_index(directory) as index:
+                for record in index.iter_records(include_files=False, include_dirs=True):
+                    writer.writerow([ record.name ])
+        else:
+            for record in scan_tree(directory, include_files=False, include_dirs=True, with_stat=False):
+                writer.writerow([ record.name ])
                 
         print(f"CSV file has been created: {output_file}")
 
 def main():
-    list_folders_in_directory()
+    list_folders_in_directory('--index' in sys.argv[1:])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,122 @@
+# Sorted unique values that spill to disk once they outgrow a memory budget
+import csv
+import heapq
+import os
+import tempfile
+from functools import partial
+
+
+# Rough per-value cost of a str in a set beyond its characters, used for the memory budget
+VALUE_OVERHEAD_BYTES = 100
+
+# Most runs merged at once, so a huge column never needs more open files than this
+MAX_MERGE_RUNS = 64
+
+
+def _write_run(values, spill_dir):
+    # Write values in sorted order to a new run file and return its path
+    fd, path = tempfile.mkstemp(prefix='run_', suffix='.csv', dir=spill_dir)
+    with open(fd, 'w', newline='', encoding='utf-8', errors='surrogatepass') as run_file:
+        writer = csv.writer(run_file)
+        writer.writerows([value] for value in values)
+    return path
+
+
+def _read_run(path):
+    with open(path, newline='', encoding='utf-8', errors='surrogatepass') as run_file:
+        for row in csv.reader(run_file):
+            yield row[0]
+
+
+def _merge_unique(iterables):
+    # k-way merge of sorted iterables, dropping values equal to the one before
+    previous = None
+    for value in heapq.merge(*iterables):
+        if value != previous:
+            yield value
+            previous = value
+
+
+class SpillingSet:
+    """ Set of strings that writes sorted runs to disk once it exceeds memory_mb.
+        add() and update() work like a set's, so it can be used as the collector in
+        csv_columns.unique_values. Iterating yields the unique values in sorted order,
+        k-way merged from the runs and whatever is still in memory, so the whole
+        column never has to fit in memory at once. Runs are csv files in spill_dir,
+        removed by close() or along with spill_dir itself.
+    """
+
+    def __init__(self, memory_mb=256, spill_dir=None):
+        self.memory_bytes = int(memory_mb * 1024 * 1024)
+        self.spill_dir = spill_dir or tempfile.gettempdir()
+        self.values = set()
+        self.used_bytes = 0
+        self.runs = []
+        self._count = None
+
+    def add(self, value):
+        if value not in self.values:
+            self.values.add(value)
+            self.used_bytes += len(value) + VALUE_OVERHEAD_BYTES
+            self._count = None
+            if self.used_bytes > self.memory_bytes:
+                self.spill()
+
+    def update(self, other):
+        if isinstance(other, SpillingSet):
+            # Take over the other set's runs rather than reading them back in
+            self.runs.extend(other.runs)
+            other.runs = []
+            other = other.values
+        for value in other:
+            self.add(value)
+        self._count = None
+
+    def spill(self):
+        """ Write the values held in memory to a sorted run and free them.
+        """
+        if self.values:
+            self.runs.append(_write_run(sorted(self.values), self.spill_dir))
+            self.values = set()
+            self.used_bytes = 0
+        # Keep the number of runs to merge, and so of open files, bounded
+        while len(self.runs) > MAX_MERGE_RUNS:
+            group, self.runs = self.runs[:MAX_MERGE_RUNS], self.runs[MAX_MERGE_RUNS:]
+            self.runs.append(_write_run(_merge_unique([_read_run(path) for path in group]), self.spill_dir))
+            for path in group:
+                os.remove(path)
+
+    def __iter__(self):
+        if not self.runs:
+            return iter(sorted(self.values))
+        return _merge_unique([_read_run(path) for path in self.runs] + [sorted(self.values)])
+
+    def __len__(self):
+        # Values can repeat between runs, so counting needs one merge pass; cache it
+        if self._count is None:
+            self._count = len(self.values) if not self.runs else sum(1 for _ in self)
+        return self._count
+
+    def close(self):
+        """ Remove this set's run files.
+        """
+        for path in self.runs:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.runs = []
+
+
+def spilling_collector(memory_mb, spill_dir):
+    """ Return a picklable factory of SpillingSets for csv_columns.unique_values.
+    """
+    return partial(SpillingSet, memory_mb, spill_dir)
+
+
+def iter_sorted(values):
+    """ Iterate the values of a set or SpillingSet in sorted order.
+    """
+    if isinstance(values, SpillingSet):
+        return iter(values)
+    return iter(sorted(values))
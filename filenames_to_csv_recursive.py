@@ -1,16 +1,26 @@
 import os
 import csv
+import sys
+from scan_tree import scan_tree
+from tree_index import open_index
 
-def write_filenames_to_csv(root_directory, output_file):
+def write_filenames_to_csv(root_directory, output_file, use_index=False):
     # Recursively write directory subfolder and file namess to a csv
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['Folder', 'Filename'])  # Write header
-
-        for foldername, subfolders, filenames in os.walk(root_directory):
-            for filename in filenames:
-                relative_path = os.path.relpath(foldername, root_directory)
-                csv_writer.writerow([relative_path, filename])
+    # With use_index, names come from the directory's SQLite tree index
+    index = open_index(root_directory) if use_index else None
+    try:
+        records = index.iter_records() if index else scan_tree(root_directory, with_stat=False)
+
+        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(['Folder', 'Filename'])  # Write header
+
+            for record in records:
+                relative_path = record.folder or '.'
+                csv_writer.writerow([relative_path, record.name])
+    finally:
+        if index:
+            index.close()
 
     print(f"Filenames have been written to {output_file}")
 
@@ -20,7 +30,7 @@ def main():
     root_directory = os.getcwd()
     output_file = 'folder_names.csv'
 
-    write_filenames_to_csv(root_directory, output_file)
+    write_filenames_to_csv(root_directory, output_file, '--index' in sys.argv[1:])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,307 @@
+# Shared timing and throughput instrumentation, switched on by a --profile flag
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+
+# Functions listed in the report when --profile-cpu is given
+CPU_PROFILE_TOP = 25
+# Allocation sites listed in the report when --profile-memory is given
+MEMORY_PROFILE_TOP = 10
+
+
+def read_proc_io():
+    """ Return this process's I/O counters (syscr, syscw, rchar, ...) on Linux, else {}.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            return {key: int(value) for key, value in (line.split(': ') for line in f)}
+    except OSError:
+        return {}
+
+
+def peak_rss_kb():
+    """ Largest resident set, in KB, of this process or any worker process it waited for.
+        None where the resource module is not available, as on Windows.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+class _NullPhase:
+    # Shared do-nothing context manager handed out while profiling is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        # Time spent in phases nested inside this one is collected here and left out of it
+        self.stack = self.profiler.stack()
+        self.nested = [0.0]
+        self.stack.append(self.nested)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.stack.pop()
+        self.profiler.add_time(self.name, elapsed - self.nested[0])
+        if self.stack:
+            self.stack[-1][0] += elapsed
+        return False
+
+
+class Profiler:
+    """ Collects phase timings and counters for one run of a tool and reports them as JSON.
+        Phases are named spans such as 'walk', 'read', 'parse' and 'write'; a phase
+        entered several times accumulates its time and number of calls. Phase times are
+        exclusive: time in a phase, timed call or timed iterator nested inside another
+        on the same thread counts only towards the inner one, so on a single thread
+        the phases add up to no more than the run. Counters such
+        as 'files', 'rows' and 'bytes' are also reported per second of the whole run.
+        Timings and counters cover this process only, not worker processes.
+    """
+
+    def __init__(self, tool, cpu=False, memory=False):
+        self.tool = tool
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.phases = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+        self.io_start = read_proc_io()
+        self.cpu_profile = cProfile.Profile() if cpu else None
+        self.memory = memory
+        if memory:
+            tracemalloc.start()
+        if self.cpu_profile:
+            self.cpu_profile.enable()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def stack(self):
+        # This thread's open phases, innermost last, each as [seconds spent in nested phases]
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def add_time(self, name, seconds):
+        # Reader threads time their phases too
+        with self.lock:
+            totals = self.phases.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self):
+        """ Stop any cProfile/tracemalloc capture and return the run's report as a dict.
+        """
+        elapsed = time.perf_counter() - self.start
+        report = {
+            'tool': self.tool,
+            'argv': sys.argv[1:],
+            'elapsed_sec': round(elapsed, 4),
+            'phases': {name: {'seconds': round(seconds, 4), 'calls': calls}
+                       for name, (seconds, calls) in self.phases.items()},
+            'counters': dict(self.counters),
+            'rates': {f'{name}_per_sec': round(value / elapsed, 1) if elapsed else None
+                      for name, value in self.counters.items()},
+            'peak_rss_kb': peak_rss_kb(),
+        }
+
+        io_end = read_proc_io()
+        if self.io_start:
+            report['io'] = {key: io_end[key] - self.io_start[key] for key in ('syscr', 'syscw', 'rchar', 'wchar')}
+
+        if self.cpu_profile:
+            self.cpu_profile.disable()
+            stats = pstats.Stats(self.cpu_profile, stream=io.StringIO())
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:CPU_PROFILE_TOP]
+            report['cpu_profile'] = [
+                {'function': f'{filename}:{line}({name})', 'calls': calls, 'total_sec': round(total, 4),
+                 'cumulative_sec': round(cumulative, 4)}
+                for (filename, line, name), (_, calls, total, cumulative, _) in rows
+            ]
+
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:MEMORY_PROFILE_TOP]
+            tracemalloc.stop()
+            report['memory'] = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top': [{'location': str(stat.traceback[0]), 'bytes': stat.size, 'blocks': stat.count} for stat in top],
+            }
+
+        return report
+
+
+# The profiler for this run, or None while profiling is off
+_active = None
+
+
+def phase(name):
+    """ Context manager timing a phase of the run; free when profiling is off.
+    """
+    if _active is None:
+        return _NULL_PHASE
+    return _active.phase(name)
+
+
+def count(name, amount=1):
+    """ Add to a throughput counter such as 'files', 'rows' or 'bytes'.
+    """
+    if _active is not None:
+        _active.count(name, amount)
+
+
+def timed(func, phase_name):
+    """ Wrap a function so every call is timed as a phase, from any thread.
+        Returns the function itself when profiling is off, so it costs nothing.
+    """
+    if _active is None:
+        return func
+    profiler = _active
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profiler.phase(phase_name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def timed_iter(iterable, phase_name, counter=None):
+    """ Attribute the time spent producing each item to a phase, and count the items.
+        Useful for lazy walkers and readers consumed by a loop that does other work.
+        Returns the iterable itself when profiling is off, so it costs nothing.
+    """
+    if _active is None:
+        return iterable
+    return _timed_iter(_active, iter(iterable), phase_name, counter)
+
+
+def _timed_iter(profiler, iterator, phase_name, counter):
+    perf_counter = time.perf_counter
+    items = 0
+    seconds = 0.0
+    try:
+        while True:
+            # Like a phase per item, but recorded once at the end; the stack is looked up
+            # each time since the loop consuming the items may enter and leave phases
+            stack = profiler.stack()
+            nested = [0.0]
+            stack.append(nested)
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed = perf_counter() - start
+                stack.pop()
+                seconds += elapsed - nested[0]
+                if stack:
+                    stack[-1][0] += elapsed
+            items += 1
+            yield item
+    finally:
+        # Record once at the end rather than per item
+        profiler.add_time(phase_name, seconds)
+        if counter:
+            profiler.count(counter, items)
+
+
+def enabled():
+    return _active is not None
+
+
+def start(tool, cpu=False, memory=False):
+    """ Start profiling this run and return the Profiler.
+    """
+    global _active
+    _active = Profiler(tool, cpu, memory)
+    return _active
+
+
+def stop():
+    """ Stop profiling and return the report, or None if profiling was off.
+    """
+    global _active
+    if _active is None:
+        return None
+    report = _active.report()
+    _active = None
+    return report
+
+
+def write_report(report, output_file=None):
+    if output_file:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Profile saved to {output_file}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2), file=sys.stderr)
+
+
+def profile_from_argv(tool):
+    """ Handle the profiling flags for a tool's main() and remove them from sys.argv, so
+        positional arguments and argparse are unaffected. Call it first thing in main().
+            --profile            print a JSON report to stderr when the tool exits
+            --profile=FILE       write the JSON report to FILE instead
+            --profile-cpu        include the top functions from cProfile
+            --profile-memory     include peak traced memory and top allocation sites
+        Without --profile nothing is started and the instrumentation calls are no-ops.
+    """
+    output_file = None
+    requested = False
+    cpu = memory = False
+    remaining = []
+    for arg in sys.argv[1:]:
+        if arg == '--profile':
+            requested = True
+        elif arg.startswith('--profile='):
+            requested = True
+            output_file = os.path.abspath(arg.split('=', 1)[1])
+        elif arg == '--profile-cpu':
+            cpu = True
+        elif arg == '--profile-memory':
+            memory = True
+        else:
+            remaining.append(arg)
+    sys.argv[1:] = remaining
+
+    if not (requested or cpu or memory):
+        return None
+
+    profiler = start(tool, cpu, memory)
+    atexit.register(lambda: write_report(stop(), output_file) if _active is profiler else None)
+    return profiler
@@ -1,40 +1,172 @@
 # Extract all unique entries from multiple csv columns by header names
 import csv
 import os
+import sys
+import tempfile
+import instrument
+from functools import partial
+from itertools import zip_longest
 from helpers import GetArgument
+from sketches import HeavyHitters, HyperLogLog, ValueCounter
+from external_sort import iter_sorted, spilling_collector
+from column_cache import ColumnCache
+from concurrent.futures import ProcessPoolExecutor
+from csv_columns import (column_indices, filter_indices, find_csv_files, is_compressed, last_index,
+                         open_csv, parse_filter, read_fieldnames, read_file_fieldnames, split_rows, unique_values,
+                         unique_values_in_file, unique_values_parallel)
 
 
 cwd = os.getcwd()
 
-def extract_columns_data(filename, column_headers):
-    """Extract unique data from multiple columns"""
+# Files at least this large are split across all CPU cores by main()
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+# Files at least this large keep unique values within SPILL_MEMORY_MB, spilling sorted runs to disk
+SPILL_MIN_BYTES = 1024 * 1024 * 1024
+SPILL_MEMORY_MB = 512
+
+# Heavy-hitter sketches track this many candidates per value asked for, for accurate top-k
+HEAVY_HITTERS_PER_VALUE = 10
+
+def make_collector(headers, approximate=False, error_rate=0.01, memory_mb=None, spill_dir=None,
+                   count=False, top_k=None):
+    """Return the factory for each column's de-duplication or counting structure"""
+    if count:
+        if approximate and top_k:
+            return partial(HeavyHitters, max(top_k * HEAVY_HITTERS_PER_VALUE, 1000))
+        return ValueCounter
+    if approximate:
+        return partial(HyperLogLog, error_rate)
+    if memory_mb:
+        return spilling_collector(memory_mb / len(headers), spill_dir)
+    return set
+
+
+def extract_columns_data(filename, column_headers, workers=1, approximate=False, error_rate=0.01,
+                         memory_mb=None, spill_dir=None, count=False, top_k=None, filters=None, cache=False):
+    """Extract unique data from multiple columns, using worker processes if workers > 1.
+    With approximate=True each column gets a fixed-size HyperLogLog sketch instead of a set,
+    so only len() of the result is meaningful, to within about error_rate.
+    With memory_mb set, each column gets a SpillingSet that writes sorted runs to spill_dir
+    once the columns together hold more than memory_mb of values.
+    With count=True each column gets a ValueCounter of how often each value occurs, or with
+    approximate=True and top_k as well, a HeavyHitters sketch sized for the top_k values.
+    filters is a list of (header, allowed values) from parse_filter; only rows passing
+    all of them are used, and they are checked during the same scan.
+    With cache=True the columns are answered from a ColumnCache of the file, parsing it
+    once in this process only for columns not cached yet; workers is then ignored.
+    A .gz, .bz2 or .xz file is decompressed as it is read in this process, since splitting
+    and caching work on the file's own bytes; workers and cache are then ignored."""
     columns_data = {}
+    filters = filters or []
     file_path = cwd + "/" + filename
     
-    with open(file_path) as csvfile:
-        raw_data = csv.DictReader(csvfile, delimiter=',')
+    if is_compressed(file_path) and (workers > 1 or cache):
+        print(f"Note: {filename} is compressed, reading it in a single process without the cache.")
+        workers = 1
+        cache = False
+    
+    with open_csv(file_path) as csvfile:
+        raw_data = csv.reader(csvfile, delimiter=',')
+        fieldnames = read_fieldnames(raw_data)
         
-        # Check if all column headers exist
-        missing_columns = [col for col in column_headers if col not in raw_data.fieldnames]
+        # Check if all column headers, and any filtered columns, exist
+        filter_headers = [header for header, _ in filters]
+        missing_columns = [col for col in column_headers + filter_headers if col not in fieldnames]
         if missing_columns:
             print(f"Error: Column(s) {missing_columns} not found in CSV file.")
-            print(f"Available columns: {raw_data.fieldnames}")
+            print(f"Available columns: {fieldnames}")
             return None
         
-        # Initialize sets for each column
-        for header in column_headers:
-            columns_data[header] = set()
+        # Resolve each header to its column index once, ignoring repeated headers
+        headers = list(dict.fromkeys(column_headers))
+        indices = column_indices(fieldnames, headers)
+        where = filter_indices(fieldnames, filters)
         
-        # Extract data for each column
-        for row in raw_data:
-            for header in column_headers:
-                value = row[header]
-                if value:  # Only add non-empty values
-                    columns_data[header].add(value.strip())  # Strip whitespace
+        collector = make_collector(headers, approximate, error_rate, memory_mb, spill_dir, count, top_k)
+        
+        # Extract data for each column, splitting rows only as far as the last one needed
+        with instrument.phase('parse'):
+            if cache:
+                column_sets = ColumnCache(file_path).unique_values(indices, collector, where, counting=count)
+            elif workers > 1:
+                column_sets = unique_values_parallel(file_path, indices, workers, collector=collector, where=where)
+            else:
+                rows = instrument.timed_iter(split_rows(csvfile, ',', last_index(indices, where)), 'read', 'rows')
+                column_sets = unique_values(rows, indices, collector, where=where)
+        instrument.count('bytes', os.path.getsize(file_path))
+        
+        for header, data in zip(headers, column_sets):
+            columns_data[header] = data
 
     return columns_data
 
 
+def check_headers(file_paths, column_headers, filters=None):
+    """Check the header row of every file against the first file's.
+    Files may order or add columns differently, which is reported but allowed since
+    indices are resolved per file. Returns False if any file lacks a requested column."""
+    first_fieldnames = None
+    consistent = True
+    
+    for file_path in file_paths:
+        fieldnames = read_file_fieldnames(file_path)
+        if first_fieldnames is None:
+            first_fieldnames = fieldnames
+        elif fieldnames != first_fieldnames:
+            print(f"Note: Header of {file_path} differs from {file_paths[0]}.")
+        
+        filter_headers = [header for header, _ in filters or []]
+        missing_columns = [col for col in column_headers + filter_headers if col not in fieldnames]
+        if missing_columns:
+            print(f"Error: Column(s) {missing_columns} not found in {file_path}.")
+            print(f"Available columns: {fieldnames}")
+            consistent = False
+    
+    return consistent
+
+
+def extract_columns_from_files(file_paths, column_headers, workers=1, approximate=False, error_rate=0.01,
+                               memory_mb=None, spill_dir=None, count=False, top_k=None, filters=None):
+    """Extract unique data from multiple columns across many plain or compressed CSV files.
+    Every file feeds one shared structure per column, as if they were one big file, so
+    the result is the same as extract_columns_data on their concatenation.
+    With workers > 1 files are read in worker processes and merged as they finish.
+    filters works as in extract_columns_data."""
+    if not file_paths:
+        print("Error: No CSV files found.")
+        return None
+    if not check_headers(file_paths, column_headers, filters):
+        return None
+    
+    headers = list(dict.fromkeys(column_headers))
+    collector = make_collector(headers, approximate, error_rate, memory_mb, spill_dir, count, top_k)
+    column_sets = [collector() for _ in headers]
+    
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(unique_values_in_file, file_path, headers, collector, filters=filters)
+                for file_path in file_paths
+            ]
+            for file_path, future in zip(file_paths, futures):
+                parts = future.result()
+                with instrument.phase('merge'):
+                    for values, part in zip(column_sets, parts):
+                        values.update(part)
+                print(f"  Processed {file_path}")
+    else:
+        for file_path in file_paths:
+            # Add straight into the shared structures, so nothing is merged afterwards
+            with instrument.phase('parse'):
+                unique_values_in_file(file_path, headers, sets=column_sets, filters=filters)
+            print(f"  Processed {file_path}")
+    
+    instrument.count('files', len(file_paths))
+    instrument.count('bytes', sum(os.path.getsize(file_path) for file_path in file_paths))
+    return dict(zip(headers, column_sets))
+
+
 def columns_to_csv(columns_data, output_filename):
     """Save multiple columns of unique data to a single CSV file"""
     if columns_data is None:
@@ -42,9 +174,6 @@ def columns_to_csv(columns_data, output_filename):
         
     file_path = cwd + "/" + output_filename
     
-    # Find the maximum number of unique values across all columns
-    max_length = max(len(data) for data in columns_data.values()) if columns_data else 0
-    
     with open(file_path, 'w', newline='') as csvfile:
         output = csv.writer(csvfile)
         
@@ -52,18 +181,12 @@ def columns_to_csv(columns_data, output_filename):
         headers = list(columns_data.keys())
         output.writerow(headers)
         
-        # Convert sets to sorted lists for consistent output
-        columns_lists = {header: sorted(list(data)) for header, data in columns_data.items()}
+        # Walk every column in sorted order side by side, so spilled columns are
+        # merged straight into the output instead of being loaded into lists
+        columns_sorted = [iter_sorted(data) for data in columns_data.values()]
         
-        # Write data rows
-        for i in range(max_length):
-            row = []
-            for header in headers:
-                if i < len(columns_lists[header]):
-                    row.append(columns_lists[header][i])
-                else:
-                    row.append('')  # Empty cell if this column has fewer values
-            output.writerow(row)
+        # Write data rows, with an empty cell where a column has fewer values
+        output.writerows(zip_longest(*columns_sorted, fillvalue=''))
 
 
 def columns_to_separate_csvs(columns_data):
@@ -78,12 +201,30 @@ def columns_to_separate_csvs(columns_data):
         with open(file_path, 'w', newline='') as csvfile:
             output = csv.writer(csvfile)
             output.writerow(['unique_values'])
-            for item in sorted(unique_data):
+            for item in iter_sorted(unique_data):
                 output.writerow([item])
         
         print(f"Saved {len(unique_data)} unique values from '{header}' to {output_filename}")
 
 
+def counts_to_csvs(columns_data, top_k=None):
+    """Save each column's value counts, most frequent first, to separate CSV files"""
+    if columns_data is None:
+        return
+    
+    for header, counts in columns_data.items():
+        output_filename = f"{header}_counts.csv"
+        file_path = cwd + "/" + output_filename
+        
+        with open(file_path, 'w', newline='') as csvfile:
+            output = csv.writer(csvfile)
+            output.writerow(['value', 'count'])
+            output.writerows(counts.top(top_k))
+        
+        kept = f"top {top_k}" if top_k else "all"
+        print(f"Saved {kept} value counts from '{header}' to {output_filename}")
+
+
 def parse_column_headers(headers_input):
     """Parse column headers from various input formats"""
     # Remove any surrounding quotes and whitespace
@@ -117,7 +258,9 @@ def load_headers_from_csv(csv_filename):
 
 
 def main():
-    filename = GetArgument("Enter filename in current directory\n", 1)
+    instrument.profile_from_argv('multi_column_extractor')
+    # A directory or a glob pattern such as "exports/*.csv.gz" runs over every matching file
+    filename = GetArgument("Enter filename, directory or glob pattern in current directory\n", 1)
     
     print("\nHow would you like to provide column headers?")
     print("1. Type them directly (comma-separated)")
@@ -135,28 +278,94 @@ def main():
         print("No valid column headers provided.")
         return
     
+    print("\nWhat would you like to do?")
+    print("1. Extract unique values")
+    print("2. Count unique values only (approximate, fixed memory)")
+    print("3. Count how often each value occurs")
+    mode_choice = input("Enter choice (1, 2 or 3): ").strip()
+    
+    top_k = None
+    if mode_choice == "3":
+        top_k_input = input("Keep only the N most frequent values (blank for all): ").strip()
+        top_k = int(top_k_input) if top_k_input.isdigit() and int(top_k_input) > 0 else None
+    
+    # Optional row filter, checked while scanning, e.g. "status == active and country in {US, CA}"
+    filter_input = input("Only use rows matching (blank for all rows): ").strip()
+    filters = None
+    if filter_input:
+        try:
+            filters = parse_filter(filter_input)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+    
     print(f"Processing columns: {column_headers}")
     
-    columns_data = extract_columns_data(filename, column_headers)
+    file_path = cwd + "/" + filename
+    if os.path.isdir(file_path) or any(char in filename for char in '*?['):
+        # Batch mode: one shared set of columns across every file, a file per worker process
+        file_paths = find_csv_files(file_path)
+        print(f"Found {len(file_paths)} CSV file(s)")
+        file_size = sum(os.path.getsize(path) for path in file_paths)
+        workers = min(os.cpu_count() or 1, len(file_paths)) if len(file_paths) > 1 else 1
+        extract = partial(extract_columns_from_files, file_paths, filters=filters)
+    else:
+        # Spread large files over every core, unless they have to be decompressed in one stream
+        file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        workers = 1
+        if file_size >= PARALLEL_MIN_BYTES and not is_compressed(file_path):
+            workers = os.cpu_count() or 1
+        # "--cache" keeps parsed columns on disk, so later runs on the same file skip parsing
+        extract = partial(extract_columns_data, filename, filters=filters, cache='--cache' in sys.argv[2:])
     
-    if columns_data:
-        print(f"\nFound unique values:")
-        for header, data in columns_data.items():
-            print(f"  {header}: {len(data)} unique values")
-        
-        print("\nHow would you like to save the output?")
-        print("1. All columns in one CSV file")
-        print("2. Separate CSV file for each column")
-        output_choice = input("Enter choice (1 or 2): ").strip()
+    if mode_choice == "2":
+        columns_data = extract(column_headers, workers, approximate=True)
+        if columns_data:
+            print(f"\nApproximate unique values (about 1% error):")
+            for header, sketch in columns_data.items():
+                print(f"  {header}: ~{len(sketch)} unique values")
+        else:
+            print("No data extracted.")
+        return
+    
+    if mode_choice == "3":
+        # Very large files only track likely top values, in fixed memory
+        approximate = top_k is not None and file_size >= SPILL_MIN_BYTES
+        columns_data = extract(column_headers, workers, approximate=approximate, count=True, top_k=top_k)
+        if columns_data:
+            if approximate:
+                print("Counts are lower-bound estimates from a heavy-hitters sketch.")
+            with instrument.phase('write'):
+                counts_to_csvs(columns_data, top_k)
+        else:
+            print("No data extracted.")
+        return
+    
+    # Very large files keep their unique values within a memory budget, spilling to a temp folder
+    memory_mb = SPILL_MEMORY_MB if file_size >= SPILL_MIN_BYTES else None
+    
+    with tempfile.TemporaryDirectory(prefix='unique_values_') as spill_dir:
+        columns_data = extract(column_headers, workers, memory_mb=memory_mb, spill_dir=spill_dir)
         
-        if output_choice == "2":
-            columns_to_separate_csvs(columns_data)
+        if columns_data:
+            print(f"\nFound unique values:")
+            for header, data in columns_data.items():
+                print(f"  {header}: {len(data)} unique values")
+            
+            print("\nHow would you like to save the output?")
+            print("1. All columns in one CSV file")
+            print("2. Separate CSV file for each column")
+            output_choice = input("Enter choice (1 or 2): ").strip()
+            
+            with instrument.phase('write'):
+                if output_choice == "2":
+                    columns_to_separate_csvs(columns_data)
+                else:
+                    output_filename = "unique_values_combined.csv"
+                    columns_to_csv(columns_data, output_filename)
+                    print(f"Output saved to {output_filename}")
         else:
-            output_filename = "unique_values_combined.csv"
-            columns_to_csv(columns_data, output_filename)
-            print(f"Output saved to {output_filename}")
-    else:
-        print("No data extracted.")
+            print("No data extracted.")
 
 
 if __name__ == '__main__':
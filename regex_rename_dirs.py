@@ -1,17 +1,15 @@
 import os
 import re
 import sys
+import batch_rename
 
 
 def rename_folders(directory, search_pattern, replace_pattern):
-    for foldername in os.listdir(directory):
-        folder_path = os.path.join(directory, foldername)
-        if os.path.isdir(folder_path):
-            new_name = re.sub(search_pattern, replace_pattern, foldername)
-            if new_name != foldername:
-                new_path = os.path.join(directory, new_name)
-                os.rename(folder_path, new_path)
-                print(f"Renamed: {foldername} -> {new_name}")
+    # Plan every rename first, so clashes are caught before any folder is touched
+    compiled_pattern = re.compile(search_pattern)
+    plan = batch_rename.plan_renames(directory, lambda foldername: compiled_pattern.sub(replace_pattern, foldername))
+    plan.apply()
+    batch_rename.report(plan)
 
 
 def GetArgument(prompt: str, arg_no: int) -> str:
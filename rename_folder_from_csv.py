@@ -1,38 +1,47 @@
 # Rename folders from csv file. 
 import os
 import csv
+import batch_rename
+from dict_csv import csvToIndex
 
 # Define the path to the directory and the CSV file
 folder_path = os.getcwd() 
 csv_file_path = 'folder_names.csv'
 
+# Turn one CSV row into an old-new name pair
+def mapping_item(row):
+    old_name, new_name = row
+    return old_name, f"{old_name} - {new_name}"
+
 # Function to read the CSV and return a dictionary of old-new name pairs
 def read_csv(file_path):
     name_mapping = {}
     with open(file_path, newline='') as csvfile:
         reader = csv.reader(csvfile)
         for row in reader:
-            old_name, new_name = row
-            name_mapping[old_name] = f"{old_name} - {new_name}"
+            old_name, new_name = mapping_item(row)
+            name_mapping[old_name] = new_name
     return name_mapping
 
-# Rename folders based on the CSV mapping
+# Same mapping from an on-disk index, built once and memory-mapped, for very large CSVs
+def read_csv_indexed(file_path):
+    return csvToIndex(file_path, file_path + '.rename.idx', mapping_item)
+
+# Rename folders based on the CSV mapping, planned in full first so that folders whose new
+# name is already taken are skipped before anything is renamed
 def rename_folders(folder_path, name_mapping):
-    for item in os.listdir(folder_path):
-        item_path = os.path.join(folder_path, item)
-        if os.path.isdir(item_path):  # Check if the item is a directory
-            if item in name_mapping:
-                old_folder_path = os.path.join(folder_path, item)
-                new_folder_path = os.path.join(folder_path, name_mapping[item])
-                # Check if a folder with the new name already exists
-                if not os.path.exists(new_folder_path):
-                    os.rename(old_folder_path, new_folder_path)
-                    print(f'Renamed folder "{item}" to "{name_mapping[item]}"')
-                else:
-                    print(f'Cannot rename folder "{item}" to "{name_mapping[item]}" because the target folder already exists.')
+    plan = batch_rename.plan_renames(folder_path, name_mapping.get)
+    plan.apply()
+    for item, new_name, reason in plan.conflicts:
+        print(f'Cannot rename folder "{item}" to "{new_name}" because {reason}.')
+    for item, new_name in plan.renames.items():
+        print(f'Renamed folder "{item}" to "{new_name}"')
 
-# Read the CSV file to get the mapping
-name_mapping = read_csv(csv_file_path)
+# Read the CSV file to get the mapping, through the index once it has a million bytes or more
+if os.path.getsize(csv_file_path) >= 1024 * 1024:
+    name_mapping = read_csv_indexed(csv_file_path)
+else:
+    name_mapping = read_csv(csv_file_path)
 
 # Rename the folders in the directory based on the CSV
 rename_folders(folder_path, name_mapping)
@@ -0,0 +1,107 @@
+# Shared directory tree scanner built on os.scandir, used by the listing tools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+# folder is relative to the scanned directory ('' for the top level)
+FileRecord = namedtuple('FileRecord', ['folder', 'name', 'extension', 'size', 'mtime', 'is_dir', 'is_link', 'path'])
+
+
+def scan_folder(path, folder='', include_files=True, include_dirs=False, with_stat=True):
+    """ List a single folder and return (records, subfolders).
+        subfolders holds (path, relative folder) pairs for the folders to descend into next.
+        Raises OSError if the folder cannot be listed.
+    """
+    with os.scandir(path) as entries:
+        entries = list(entries)
+
+    records = []
+    subfolders = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+
+        if is_dir:
+            is_link = entry.is_symlink()
+            if not is_link:
+                subfolders.append((entry.path, os.path.join(folder, entry.name)))
+            if include_dirs:
+                records.append(FileRecord(folder, entry.name, '', None, None, True, is_link, entry.path))
+        elif include_files:
+            size = mtime = None
+            if with_stat:
+                # DirEntry caches the stat result, and on Windows it is free from the listing
+                try:
+                    stat = entry.stat()
+                    size, mtime = stat.st_size, stat.st_mtime
+                except OSError:
+                    pass
+            extension = os.path.splitext(entry.name)[1]
+            records.append(FileRecord(folder, entry.name, extension, size, mtime, False, entry.is_symlink(), entry.path))
+
+    return records, subfolders
+
+
+def scan_tree(directory, include_files=True, include_dirs=False, with_stat=True, onerror=None, folder=''):
+    """ Walk a directory tree once and yield a FileRecord for each entry.
+        Entries come out in the same order as a top-down os.walk: everything in a folder,
+        then each subfolder in turn. Symlinked folders are listed but not followed.
+        With with_stat=False, size and mtime are None and no stat call is made per file.
+        Unreadable folders are skipped, or passed to onerror like os.walk.
+        folder is the relative folder reported for the top level, for scanning a subtree.
+    """
+    stack = [(directory, folder)]
+
+    while stack:
+        path, folder = stack.pop()
+        try:
+            records, subfolders = scan_folder(path, folder, include_files, include_dirs, with_stat)
+        except OSError as e:
+            if onerror is not None:
+                onerror(e)
+            continue
+
+        yield from records
+
+        # Reverse so the first subfolder is popped and scanned next
+        stack.extend(reversed(subfolders))
+
+
+def _scan_subtree(path, folder, include_files, include_dirs, with_stat):
+    # Worker entry point, returns a list so results can be sent back from a process
+    return list(scan_tree(path, include_files, include_dirs, with_stat, folder=folder))
+
+
+def scan_tree_parallel(directory, workers=4, include_files=True, include_dirs=False, with_stat=True,
+                       use_processes=False, sort=False):
+    """ Like scan_tree, but each top-level subfolder is scanned by a pool of workers.
+        Threads suit latency-bound network filesystems, since scandir and stat release the GIL;
+        use_processes=True uses a process pool instead. Results are merged in the same order
+        scan_tree would give, or sorted by folder and name when sort=True so the output does
+        not depend on the filesystem's listing order.
+    """
+    try:
+        records, subfolders = scan_folder(directory, '', include_files, include_dirs, with_stat)
+    except OSError:
+        return
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_scan_subtree, path, folder, include_files, include_dirs, with_stat)
+            for path, folder in subfolders
+        ]
+
+        if sort:
+            for future in futures:
+                records.extend(future.result())
+            records.sort(key=lambda record: (record.folder.split(os.sep) if record.folder else [], record.name))
+            yield from records
+            return
+
+        yield from records
+        for future in futures:
+            yield from future.result()
@@ -0,0 +1,123 @@
+# Fixed-memory streaming sketches for large CSV columns
+import heapq
+import math
+from collections import Counter
+from hashlib import blake2b
+
+
+def hash64(value):
+    """ Stable 64-bit hash of a string, the same in every process unlike hash().
+    """
+    return int.from_bytes(blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """ Approximate count of distinct values in fixed memory.
+        error_rate is the target relative standard error; the sketch uses 2**p one-byte
+        registers with p chosen so that 1.04 / sqrt(2**p) <= error_rate (16 KB at 1%).
+        add() takes strings like set.add, update() merges another sketch like set.update,
+        and len() returns the estimate so it can stand in for a set in summaries.
+    """
+
+    def __init__(self, error_rate=0.01):
+        registers = (1.04 / error_rate) ** 2
+        self.p = min(max(math.ceil(math.log2(registers)), 4), 18)
+        self.m = 1 << self.p
+        self.registers = bytearray(self.m)
+        self._value_bits = 64 - self.p
+        self._value_mask = (1 << self._value_bits) - 1
+
+    def add(self, value):
+        x = hash64(value)
+        index = x >> self._value_bits
+        # Rank is the position of the first 1 bit in the remaining bits
+        rank = self._value_bits - (x & self._value_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, other):
+        if other.p != self.p:
+            raise ValueError("Cannot merge sketches with different error rates")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        m = self.m
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+
+        # Small range correction: linear counting while many registers are still empty
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def __len__(self):
+        return self.count()
+
+
+def _top(items, k=None):
+    # Most frequent first, ties broken by value so the order is the same in every run
+    key = lambda item: (-item[1], item[0])
+    if k is None:
+        return sorted(items, key=key)
+    return heapq.nsmallest(k, items, key=key)
+
+
+class ValueCounter(Counter):
+    """ Exact count of every value, usable wherever a set collects values.
+        add() counts one occurrence and update() adds another counter's counts, as
+        Counter.update does, so per-process counters merge into exact totals.
+    """
+
+    def add(self, value):
+        self[value] += 1
+
+    def top(self, k=None):
+        """ Return (value, count) pairs, most frequent first, or only the first k.
+            Picking k uses a bounded heap rather than sorting every value.
+        """
+        return _top(self.items(), k)
+
+
+class HeavyHitters:
+    """ Approximate counts of the most frequent values in fixed memory (Misra-Gries).
+        At most 2 * capacity values are tracked. When that fills up, every count drops
+        by the (capacity + 1)th largest and values reaching zero are forgotten, so a
+        reported count is low by at most total / (capacity + 1), and any value occurring
+        more often than that is always kept. Sketches merge with update().
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+        self.total = 0
+
+    def add(self, value):
+        counts = self.counts
+        counts[value] = counts.get(value, 0) + 1
+        self.total += 1
+        if len(counts) > 2 * self.capacity:
+            self._prune()
+
+    def update(self, other):
+        counts = self.counts
+        for value, count in other.counts.items():
+            counts[value] = counts.get(value, 0) + count
+        self.total += other.total
+        if len(counts) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        cut = heapq.nlargest(self.capacity + 1, self.counts.values())[-1]
+        self.counts = {value: count - cut for value, count in self.counts.items() if count > cut}
+
+    def top(self, k=None):
+        """ Return (value, estimated count) pairs, most frequent first, or only the first k.
+        """
+        return _top(self.counts.items(), k)
+
+    def __len__(self):
+        return len(self.counts)
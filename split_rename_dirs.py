@@ -1,17 +1,18 @@
 import os
+import batch_rename
+
+
+def new_folder_name(foldername):
+    new_name = foldername.split("_")
+    new_name = new_name[0] + "_" + new_name[1]
+    return new_name.upper()
 
 
 def rename_folders(directory):
-    for foldername in os.listdir(directory):
-        folder_path = os.path.join(directory, foldername)
-        if os.path.isdir(folder_path):
-            new_name = foldername.split("_")
-            new_name = new_name[0] + "_" + new_name[1]
-            new_name = new_name.upper()
-            if new_name != foldername:
-                new_path = os.path.join(directory, new_name)
-                os.rename(folder_path, new_path)
-                print(f"Renamed: {foldername} -> {new_name}")
+    # Plan every rename first, so clashes are caught before any folder is touched
+    plan = batch_rename.plan_renames(directory, new_folder_name)
+    plan.apply()
+    batch_rename.report(plan)
 
 
 # def GetArgument(prompt: str, arg_no: int) -> str:
@@ -1,48 +1,214 @@
 import os
-import math
+import sys
+import json
+import mmap
+import hashlib
+import instrument
+from concurrent.futures import ThreadPoolExecutor
 
-def split_file(input_file, max_size_mb=30):
+
+def find_split_points(data, max_size_bytes):
+    """ Return (start, end) byte ranges of at most max_size_bytes each.
+        Each range ends just after the last newline that fits, or failing that on a
+        UTF-8 character boundary, so no line or character is cut if it can be avoided.
+    """
+    size = len(data)
+    points = []
+    start = 0
+
+    while start < size:
+        end = min(start + max_size_bytes, size)
+        if end < size:
+            newline = data.rfind(b'\n', start, end)
+            if newline >= start:
+                end = newline + 1
+            else:
+                # No newline in range, step back over UTF-8 continuation bytes (10xxxxxx)
+                while end > start and data[end] & 0xC0 == 0x80:
+                    end -= 1
+                if end == start:
+                    end = min(start + max_size_bytes, size)
+        points.append((start, end))
+        start = end
+
+    return points
+
+
+def write_part(data, start, end, part_filename):
+    # Write one part straight from the mapped file and return its checksum
+    part = memoryview(data)[start:end]
+    try:
+        with open(part_filename, 'wb') as part_file:
+            part_file.write(part)
+        return hashlib.sha256(part).hexdigest()
+    finally:
+        part.release()
+
+
+def split_file(input_file, max_size_mb=30, workers=1, write_manifest=True):
+    """ Split a file into parts of at most max_size_mb, measured in bytes.
+        The file is memory-mapped and parts are written from slices of the mapping
+        without copying, by a pool of threads when workers > 1. A JSON manifest of
+        part names, offsets and SHA-256 checksums is written next to the parts so
+        they can be verified or joined back together later.
+        Returns the list of part filenames.
+    """
     # Convert MB to bytes
-    max_size_bytes = max_size_mb * 1024 * 1024
-    
+    max_size_bytes = int(max_size_mb * 1024 * 1024)
+
     # Get the base filename without extension
     base_name = os.path.splitext(input_file)[0]
-    
+
     # Get total file size
     file_size = os.path.getsize(input_file)
-    
-    # Calculate number of chunks needed
-    num_chunks = math.ceil(file_size / max_size_bytes)
-    
-    # Read and split the file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        for chunk_num in range(num_chunks):
-            # Calculate chunk size for even distribution
-            chunk_size = min(max_size_bytes, file_size - (chunk_num * max_size_bytes))
-            
-            # Create chunk filename
-            chunk_filename = f"{base_name}_part{chunk_num + 1}.txt"
-            
-            # Read chunk_size bytes
-            content = f.read(chunk_size)
-            
-            # Write chunk to new file
-            with open(chunk_filename, 'w', encoding='utf-8') as chunk_file:
-                chunk_file.write(content)
-            
-            print(f"Created {chunk_filename} ({len(content) / 1024 / 1024:.2f} MB)")
+
+    parts = []
+    source_hash = hashlib.sha256()
+
+    with open(input_file, 'rb') as f:
+        # Empty files cannot be mapped, and produce no parts
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if file_size else b''
+        try:
+            with instrument.phase('plan'):
+                points = find_split_points(data, max_size_bytes)
+            part_filenames = [f"{base_name}_part{chunk_num + 1}.txt" for chunk_num in range(len(points))]
+
+            with instrument.phase('write'), ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+                checksums = executor.map(
+                    lambda args: write_part(data, *args),
+                    [(start, end, part_filename) for (start, end), part_filename in zip(points, part_filenames)]
+                )
+                for (start, end), part_filename, checksum in zip(points, part_filenames, checksums):
+                    parts.append({
+                        'name': os.path.basename(part_filename),
+                        'offset': start,
+                        'length': end - start,
+                        'sha256': checksum
+                    })
+                    print(f"Created {part_filename} ({(end - start) / 1024 / 1024:.2f} MB)")
+
+            if write_manifest:
+                with instrument.phase('checksum'):
+                    source_hash.update(data)
+        finally:
+            if file_size:
+                data.close()
+
+    if write_manifest:
+        manifest = {
+            'source': os.path.basename(input_file),
+            'size': file_size,
+            'sha256': source_hash.hexdigest(),
+            'parts': parts
+        }
+        with open(manifest_path_for(input_file), 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+    instrument.count('bytes', file_size)
+    instrument.count('parts', len(part_filenames))
+    return part_filenames
+
+
+def manifest_path_for(input_file):
+    return f"{os.path.splitext(input_file)[0]}_manifest.json"
+
+
+def load_manifest(manifest_path):
+    with open(manifest_path, encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def verify_parts(manifest_path, check_source=True):
+    """ Check every part listed in a manifest against its recorded size and checksum.
+        If the original file is still next to the manifest it is checked as well.
+        Returns a list of problems, empty when everything matches.
+    """
+    manifest = load_manifest(manifest_path)
+    folder = os.path.dirname(manifest_path)
+    problems = []
+
+    expected_offset = 0
+    for part in manifest['parts']:
+        part_path = os.path.join(folder, part['name'])
+        if part['offset'] != expected_offset:
+            problems.append(f"{part['name']}: starts at byte {part['offset']}, expected {expected_offset}")
+        expected_offset = part['offset'] + part['length']
+
+        if not os.path.exists(part_path):
+            problems.append(f"{part['name']}: missing")
+        elif os.path.getsize(part_path) != part['length']:
+            problems.append(f"{part['name']}: {os.path.getsize(part_path)} bytes, expected {part['length']}")
+        elif file_sha256(part_path) != part['sha256']:
+            problems.append(f"{part['name']}: checksum mismatch")
+
+    if expected_offset != manifest['size']:
+        problems.append(f"Parts cover {expected_offset} bytes, expected {manifest['size']}")
+
+    source_path = os.path.join(folder, manifest['source'])
+    if check_source and os.path.exists(source_path) and file_sha256(source_path) != manifest['sha256']:
+        problems.append(f"{manifest['source']}: checksum does not match the manifest")
+
+    return problems
+
+
+def join_parts(manifest_path, output_file=None):
+    """ Join the parts listed in a manifest back into one file and verify the result.
+        Writes to output_file, or to the original name with '.joined' appended.
+        Returns the output path; raises ValueError if the joined file does not match.
+    """
+    manifest = load_manifest(manifest_path)
+    folder = os.path.dirname(manifest_path)
+    output_file = output_file or os.path.join(folder, manifest['source'] + '.joined')
+
+    joined_hash = hashlib.sha256()
+    with open(output_file, 'wb') as out:
+        for part in manifest['parts']:
+            with open(os.path.join(folder, part['name']), 'rb') as part_file:
+                for chunk in iter(lambda: part_file.read(1024 * 1024), b''):
+                    joined_hash.update(chunk)
+                    out.write(chunk)
+
+    if joined_hash.hexdigest() != manifest['sha256']:
+        raise ValueError(f"Joined file {output_file} does not match the original checksum")
+
+    return output_file
+
 
 def main():
+    instrument.profile_from_argv('split_txt')
+    # "python split_txt.py verify|join <manifest>" checks or rejoins parts
+    if len(sys.argv) > 2 and sys.argv[1] in ('verify', 'join'):
+        try:
+            if sys.argv[1] == 'verify':
+                problems = verify_parts(sys.argv[2])
+                for problem in problems:
+                    print(problem)
+                print("All parts verified." if not problems else f"{len(problems)} problem(s) found.")
+            else:
+                output_file = join_parts(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+                print(f"Joined and verified {output_file}")
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+        return
+
     # Get input file path from user
     input_file = input("Enter the path to your text file: ")
-    
+
     # Validate file exists
     if not os.path.exists(input_file):
         print("Error: File does not exist!")
         return
-    
+
     try:
-        split_file(input_file)
+        split_file(input_file, workers=4)
         print("File splitting completed successfully!")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
@@ -0,0 +1,226 @@
+# Persistent SQLite index of a directory tree, refreshed by re-listing only changed folders
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from scan_tree import FileRecord, scan_folder
+
+
+# Indexes live outside the trees they describe, so the tools never list them as files
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'tree_index')
+
+
+def default_index_path(directory):
+    """ Path of the index for a directory, keyed on its absolute path under CACHE_DIR.
+    """
+    key = hashlib.sha1(os.path.abspath(directory).encode('utf-8', 'surrogatepass')).hexdigest()
+    return os.path.join(CACHE_DIR, f'{key}.sqlite')
+
+
+class TreeIndex:
+    """ On-disk index of every file and folder below a directory.
+        Paths are stored relative to the directory, with '' for the directory itself.
+        Each folder keeps the mtime it had when it was last listed, so refresh() only
+        re-lists folders whose mtime changed since. A file edited in place does not
+        change its folder's mtime, so use refresh(full=True) when sizes must be exact.
+    """
+
+    def __init__(self, directory, index_path=None):
+        self.directory = os.path.abspath(directory)
+        self.index_path = index_path or default_index_path(self.directory)
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        # Skip the index's own files if it is given a path inside the indexed tree
+        self.ignored_paths = {self.index_path + suffix for suffix in ('', '-journal', '-wal', '-shm')}
+
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.create_function('REGEXP', 2, _regexp_match, deterministic=True)
+        with self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS entries (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                name TEXT,
+                size INTEGER,
+                mtime REAL,
+                is_dir INTEGER,
+                is_link INTEGER,
+                listed_mtime INTEGER
+            )''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent, name)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+            # An index built for another directory is useless, start again
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'directory'").fetchone()
+            if row is None or row[0] != self.directory:
+                self.conn.execute('DELETE FROM entries')
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('directory', ?)", (self.directory,))
+                self.conn.execute("INSERT INTO entries VALUES ('', NULL, '', NULL, NULL, 1, 0, NULL)")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def refresh(self, full=False):
+        """ Bring the index up to date with the filesystem and return counts of the work done.
+            Every indexed folder is stat'd once; only new folders and folders whose mtime
+            changed are listed again. full=True lists every folder.
+        """
+        stats = {'dirs_checked': 0, 'dirs_listed': 0, 'added': 0, 'removed': 0}
+        stack = ['']
+
+        with self.conn:
+            while stack:
+                folder = stack.pop()
+                path = os.path.join(self.directory, folder) if folder else self.directory
+                stats['dirs_checked'] += 1
+
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    stats['removed'] += self._delete_tree(folder)
+                    continue
+
+                row = self.conn.execute('SELECT listed_mtime FROM entries WHERE path = ?', (folder,)).fetchone()
+                if full or row is None or row[0] != mtime:
+                    # Stat before listing, so a change made during the listing is caught next time
+                    if self._relist(path, folder, mtime, stats):
+                        stats['dirs_listed'] += 1
+
+                subfolders = self.conn.execute(
+                    'SELECT path FROM entries WHERE parent = ? AND is_dir = 1 AND is_link = 0 ORDER BY name',
+                    (folder,)
+                ).fetchall()
+                stack.extend(subfolder for subfolder, in reversed(subfolders))
+
+        return stats
+
+    def _relist(self, path, folder, mtime, stats):
+        try:
+            records, _ = scan_folder(path, folder, include_dirs=True)
+        except OSError:
+            return False
+
+        existing = dict(self.conn.execute('SELECT name, is_dir FROM entries WHERE parent = ?', (folder,)))
+        found = set()
+
+        for record in records:
+            if record.path in self.ignored_paths:
+                continue
+            found.add(record.name)
+            entry_path = os.path.join(folder, record.name)
+            if record.name not in existing:
+                stats['added'] += 1
+            elif existing[record.name] and not record.is_dir:
+                # A folder was replaced by a file, drop everything that was below it
+                self._delete_tree(entry_path)
+
+            # A folder's listed_mtime is only set once that folder itself has been listed
+            self.conn.execute('''INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+                ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime,
+                    is_dir = excluded.is_dir, is_link = excluded.is_link,
+                    listed_mtime = CASE WHEN excluded.is_dir AND entries.is_dir THEN entries.listed_mtime END''',
+                (entry_path, folder, record.name, record.size, record.mtime, record.is_dir, record.is_link))
+
+        for name in existing.keys() - found:
+            stats['removed'] += self._delete_tree(os.path.join(folder, name))
+
+        self.conn.execute('UPDATE entries SET listed_mtime = ? WHERE path = ?', (mtime, folder))
+        return True
+
+    def _delete_tree(self, folder):
+        if folder == '':
+            # The indexed directory itself is gone, keep only an unlisted root entry
+            cursor = self.conn.execute("DELETE FROM entries WHERE path != ''")
+            self.conn.execute("UPDATE entries SET listed_mtime = NULL WHERE path = ''")
+            return cursor.rowcount
+
+        # Paths below folder sort between "folder/" and the next separator character
+        prefix = folder + os.sep
+        upper = folder + chr(ord(os.sep) + 1)
+        cursor = self.conn.execute('DELETE FROM entries WHERE (path >= ? AND path < ?) OR path = ?',
+                                   (prefix, upper, folder))
+        return cursor.rowcount
+
+    def _record(self, folder, name, size, mtime, is_dir, is_link):
+        path = os.path.join(folder, name)
+        extension = '' if is_dir else os.path.splitext(name)[1]
+        return FileRecord(folder, name, extension, size, mtime, bool(is_dir), bool(is_link),
+                          os.path.join(self.directory, path))
+
+    def iter_records(self, include_files=True, include_dirs=False):
+        """ Yield FileRecords from the index in scan_tree order, with each folder sorted by name.
+        """
+        stack = ['']
+        while stack:
+            folder = stack.pop()
+            rows = self.conn.execute(
+                'SELECT name, size, mtime, is_dir, is_link FROM entries WHERE parent = ? ORDER BY name',
+                (folder,)
+            ).fetchall()
+
+            subfolders = []
+            for name, size, mtime, is_dir, is_link in rows:
+                if is_dir:
+                    if not is_link:
+                        subfolders.append(os.path.join(folder, name))
+                    if include_dirs:
+                        yield self._record(folder, name, None, None, is_dir, is_link)
+                elif include_files:
+                    yield self._record(folder, name, size, mtime, is_dir, is_link)
+
+            stack.extend(reversed(subfolders))
+
+    def file_counts(self):
+        """ Return a dict of relative folder -> number of files directly inside it.
+        """
+        return dict(self.conn.execute('SELECT parent, COUNT(*) FROM entries WHERE is_dir = 0 GROUP BY parent'))
+
+    def find_files(self, pattern):
+        """ Yield FileRecords for files whose name matches a regex, matched from the start
+            of the name like re.match.
+        """
+        rows = self.conn.execute(
+            'SELECT parent, name, size, mtime, is_dir, is_link FROM entries '
+            'WHERE is_dir = 0 AND name REGEXP ? ORDER BY path',
+            (pattern,)
+        )
+        for row in rows:
+            yield self._record(*row)
+
+
+_compiled_patterns = {}
+
+def _regexp_match(pattern, value):
+    compiled = _compiled_patterns.get(pattern)
+    if compiled is None:
+        compiled = _compiled_patterns[pattern] = re.compile(pattern)
+    return compiled.match(value) is not None
+
+
+def open_index(directory, index_path=None):
+    """ Open the index for a directory and refresh it, ready for queries.
+    """
+    index = TreeIndex(directory, index_path)
+    index.refresh()
+    return index
+
+
+def main():
+    # Usage: python tree_index.py [directory] [--full]
+    args = [arg for arg in sys.argv[1:] if arg != '--full']
+    directory = args[0] if args else os.getcwd()
+    full = '--full' in sys.argv[1:]
+    with TreeIndex(directory) as index:
+        stats = index.refresh(full=full)
+    print(f"Index updated: {index.index_path}")
+    print(f"  Folders checked: {stats['dirs_checked']}, re-listed: {stats['dirs_listed']}")
+    print(f"  Entries added: {stats['added']}, removed: {stats['removed']}")
+
+
+if __name__ == "__main__":
+    main()